@@ -1,5 +1,4 @@
 from RefinerIO import RefinerIO
-import wx
 
 
 class ACSRefiner:
@@ -13,7 +12,7 @@ class ACSRefiner:
             self.__io.read_acs_data(file_paths=acs_file_path,
                                     columns=columns, columns_dict=columns_dict)
         else:
-            wx.MessageBox("Error: One or more columns must be selected!")
+            self.__io.message("Error: One or more columns must be selected!")
 
     def import_pums(self, pums_file_path):
         self.__io.read_pums_data(file_paths=pums_file_path)
@@ -22,7 +21,7 @@ class ACSRefiner:
         self.__io.read_marginals(file_paths=marginal_file_path)
 
     def start_ipf(self):
-        self.__io.ipf()
+        self.__io.ipf(joint=self.__ui.joint_ipf_cb.IsChecked())
 
     def output(self):
         self.__io.output_acs_data()
@@ -0,0 +1,312 @@
+# Benchmarks for the post processor's I/O and data preparation paths
+# Usage: python Benchmark.py <name>, where <name> is one of BENCHMARKS
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from FrameAccumulator import FrameAccumulator
+from InputSchema import InputSchema
+from IO import IO
+from IpfEngine import IpfEngine
+from IpfJob import IpfJob
+from IpfLog import IpfLog
+from PumsRecoder import PumsRecoder
+from RefinerIO import RefinerIO
+
+
+class HeadlessWidget:
+    def IsEnabled(self):
+        return True
+
+    def Enable(self):
+        pass
+
+    def AppendText(self, text):
+        pass
+
+
+class HeadlessInterface:
+    def __init__(self):
+        self.export_button = HeadlessWidget()
+        self.display_text_box = HeadlessWidget()
+
+
+def write_cardio_files(out_dir, num_files, num_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    paths = []
+    for file_num in range(num_files):
+        data = pd.DataFrame({"State": rng.choice(["CA", "NY", "TX", "FL"], num_rows),
+                             "Intervention": rng.choice(["Baseline", "Statins"], num_rows),
+                             "Time": rng.integers(0, 10, num_rows),
+                             "Race_Gender": rng.choice(["WM", "WF", "BM", "BF"], num_rows),
+                             "Pop": rng.integers(1, 1000, num_rows),
+                             "Ten_year_CHD": rng.uniform(0, 1, num_rows)})
+
+        path = os.path.join(out_dir, "chd_" + str(file_num) + ".csv")
+        data.to_csv(path, index=False)
+        paths.append(path)
+
+    return paths
+
+
+def benchmark_read(num_files=64, num_rows=20000, worker_counts=(1, 4, 16)):
+    io = IO(HeadlessInterface())
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        paths = write_cardio_files(out_dir, num_files, num_rows)
+
+        print("IO.read: " + str(num_files) + " files x " + str(num_rows) + " rows")
+        for workers in worker_counts:
+            start = time.perf_counter()
+            io.read(paths, ref_header=["Pop", "Ten_year_CHD"], ignore_index=True,
+                    index_col="State", workers=workers)
+            elapsed = time.perf_counter() - start
+
+            print("%3d workers: %8.1f files/sec" % (workers, num_files / elapsed))
+
+
+def benchmark_append(part_counts=(250, 500, 1000, 2000), num_rows=200):
+    rng = np.random.default_rng(0)
+    part = pd.DataFrame({"FIPS": rng.integers(1000, 60000, num_rows),
+                         "RACE_ETH": rng.choice(["WhiteNH", "BlackNH"], num_rows),
+                         "total": rng.uniform(0, 1000, num_rows)})
+
+    print("Growing a frame from " + str(num_rows) + "-row parts")
+    for num_parts in part_counts:
+        start = time.perf_counter()
+        data = pd.DataFrame()
+        for i in range(num_parts):
+            data = part if data.empty else pd.concat([data, part], ignore_index=True)
+        repeated = time.perf_counter() - start
+
+        start = time.perf_counter()
+        accumulator = FrameAccumulator(ignore_index=True)
+        for i in range(num_parts):
+            accumulator.append(part)
+        accumulator.get_frame()
+        accumulated = time.perf_counter() - start
+
+        print("%5d parts: repeated append %8.3f s, accumulator %8.3f s"
+              % (num_parts, repeated, accumulated))
+
+
+def legacy_age_cat(row):
+    for label, (lower, upper) in LEGACY_AGE_BOUNDS.items():
+        if lower <= row["AGEP"] <= upper:
+            return label
+    return "85+"
+
+
+LEGACY_AGE_BOUNDS = {"0-5": (0, 4), "5-9": (5, 9), "10-14": (10, 14), "15-19": (15, 19),
+                     "20-24": (20, 24), "25-34": (25, 34), "35-44": (35, 44), "45-54": (45, 54),
+                     "55-59": (55, 59), "60-64": (60, 64), "65-74": (65, 74), "75-84": (75, 84)}
+
+
+def legacy_race_ethnicity(row):
+    if row["HISP"] == 1:
+        if row["RAC1P"] == 1:
+            return "WhiteNH"
+        elif row["RAC1P"] == 2:
+            return "BlackNH"
+        else:
+            return "OtherNH"
+    else:
+        return "Hispanic"
+
+
+def legacy_sex(row):
+    if row["SEX"] == 1:
+        return "Male"
+    elif row["SEX"] == 2:
+        return "Female"
+
+
+def legacy_education(row, bounds):
+    for label, upper in zip(RefinerIO.EDU, bounds):
+        if row["SCHL"] <= upper:
+            return label
+
+
+def write_pums_file(path, num_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    schl = rng.integers(1, 25, num_rows).astype(float)
+    schl[rng.uniform(size=num_rows) < 0.05] = np.nan
+
+    data = pd.DataFrame({"PWGTP": rng.integers(1, 500, num_rows),
+                         "AGEP": rng.integers(0, 96, num_rows),
+                         "SEX": rng.integers(1, 3, num_rows),
+                         "RAC1P": rng.integers(1, 10, num_rows),
+                         "HISP": rng.integers(1, 25, num_rows) * (rng.uniform(size=num_rows) < 0.3) + 1,
+                         "SCHL": schl,
+                         "PINCP": rng.integers(0, 200000, num_rows)})
+    data.to_csv(path, index=False)
+
+
+def benchmark_pums(num_rows=2000000, years=("07", "12")):
+    io = IO(HeadlessInterface())
+    recoder = PumsRecoder(age_cat=RefinerIO.AGE_CAT, edu=RefinerIO.EDU)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        path = os.path.join(out_dir, "ss12pca.csv")
+        write_pums_file(path, num_rows)
+        data = io.read_csv([path], columns=RefinerIO.PUMS_COLUMNS, ignore_index=True,
+                           dtype=InputSchema.get_dtypes("pums"))
+
+    print("PUMS recoding: " + str(num_rows) + " rows")
+    for year in years:
+        start = time.perf_counter()
+        recoded = recoder.recode(data.copy(), year=year)
+        vectorized = time.perf_counter() - start
+
+        bounds = PumsRecoder.SCHL_BOUNDS["post2008" if int(year) >= PumsRecoder.FIRST_SCHL_YEAR else "pre2008"]
+        start = time.perf_counter()
+        legacy = {"AGE_CAT": data.apply(legacy_age_cat, axis=1),
+                  "RACE_ETH": data.apply(legacy_race_ethnicity, axis=1),
+                  "SEX_": data.apply(legacy_sex, axis=1),
+                  "EDU": data.apply(legacy_education, axis=1, args=(bounds,))}
+        row_wise = time.perf_counter() - start
+
+        identical = all([list(recoded[col]) == list(values) for col, values in legacy.items()])
+        print("20%s: apply(axis=1) %8.2f s, vectorized %6.2f s, identical: %s"
+              % (year, row_wise, vectorized, identical))
+
+
+def legacy_ipf(seed, aggregates, dimensions, tolerance=IpfEngine.TOLERANCE,
+               max_iterations=IpfEngine.MAX_ITERATIONS):
+    # long-format raking, regrouping the frame for every margin of every iteration
+    df = seed.copy()
+    df["total"] = df["total"].astype(float)
+
+    for iteration in range(max_iterations):
+        for features, aggregate in zip(dimensions, aggregates):
+            current = df.groupby(features[0])["total"].transform("sum")
+            df["total"] = df["total"] * df[features[0]].map(aggregate) / current
+
+        conv = max([(df.groupby(features[0])["total"].sum() / aggregate - 1).abs().max()
+                    for features, aggregate in zip(dimensions, aggregates)])
+        if conv <= tolerance:
+            break
+
+    return df
+
+
+def write_ipf_seed(rng):
+    strata = {"RACE_ETH": ["WhiteNH", "BlackNH"], "SEX_": ["Male", "Female"],
+              "AGE_CAT": list(RefinerIO.AGE_CAT)[5:],
+              "EDU": list(RefinerIO.EDU)}
+
+    seed = pd.MultiIndex.from_product(list(strata.values()), names=list(strata)).to_frame(index=False)
+    seed["total"] = rng.lognormal(3, 1.5, len(seed))
+    seed = seed.sample(frac=0.7, random_state=0).reset_index(drop=True)
+
+    aggregates = []
+    for feature in strata:
+        categories = np.sort(seed[feature].unique())
+        estimates = rng.uniform(0.2, 1, len(categories))
+        aggregates.append(pd.Series(estimates / estimates.sum() * 1e6,
+                                    index=pd.Index(categories, name=feature), name="total"))
+
+    return seed, aggregates, [[feature] for feature in strata]
+
+
+def benchmark_ipf(num_states=10, dtypes=(np.float64, np.float32)):
+    rng = np.random.default_rng(0)
+    seeds = [write_ipf_seed(rng) for state in range(num_states)]
+
+    print("IPF by race, gender, age and education: " + str(num_states) + " states")
+    start = time.perf_counter()
+    legacy = [legacy_ipf(seed, aggregates, dimensions) for seed, aggregates, dimensions in seeds]
+    long_format = time.perf_counter() - start
+
+    for dtype in dtypes:
+        start = time.perf_counter()
+        raked = [IpfEngine(seed, aggregates, dimensions, dtype=dtype).iteration(IpfLog())
+                 for seed, aggregates, dimensions in seeds]
+        dense = time.perf_counter() - start
+
+        difference = max([(np.abs(df["total"] - ref["total"]) / ref["total"]).max()
+                          for df, ref in zip(raked, legacy)])
+        print("%-8s long format %7.3f s, dense %7.4f s, max relative difference %.1e"
+              % (np.dtype(dtype).name + ":", long_format, dense, difference))
+
+
+def write_marginal(rng, fips, population=1e6):
+    marginal = {"ID2": fips}
+    for categories in [IpfJob.RACE_ETHNICITY, IpfJob.SEX_CAT, IpfJob.AGE_CAT, IpfJob.EDU]:
+        estimates = rng.uniform(0.5, 1, len(categories))
+        for column, estimate in zip(categories.values(), estimates / estimates.sum() * population):
+            marginal[column] = estimate
+
+    return pd.Series(marginal)
+
+
+def benchmark_joint(num_states=5, num_rows=200000):
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        jobs = []
+        for fips in range(1, num_states + 1):
+            path = os.path.join(out_dir, "ss12p" + str(fips) + ".csv")
+            write_pums_file(path, num_rows, seed=fips)
+            jobs.append((path, write_marginal(rng, fips)))
+
+        print("IPF per state, two-stage vs joint: " + str(num_states) + " states x " + str(num_rows) + " rows")
+        elapsed = {False: 0, True: 0}
+        tables = {False: [], True: []}
+        for path, marginal in jobs:
+            job = IpfJob(path, "ST", "12", marginal)
+            job.read()
+
+            # both modes rake the same PUMS counts
+            for joint in [False, True]:
+                job.joint = joint
+                start = time.perf_counter()
+                tables[joint].append(job.rake()[0])
+                elapsed[joint] += (time.perf_counter() - start) / num_states
+
+    print("raking: two-stage %7.4f s, joint %7.4f s per state" % (elapsed[False], elapsed[True]))
+
+    keys = ["FIPS", "RACE_ETH", "SEX_", "EDU"]
+    cells = pd.merge(pd.concat(tables[False]), pd.concat(tables[True]), on=keys + ["YEAR"],
+                     suffixes=("_two_stage", "_joint"))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cells["rel_diff"] = np.where(cells["total_two_stage"] > 0,
+                                     (cells["total_joint"] / cells["total_two_stage"] - 1).abs(),
+                                     np.where(cells["total_joint"] > 0, np.inf, 0))
+
+    print(cells[keys + ["total_two_stage", "total_joint", "rel_diff"]].to_string(index=False))
+    print("max relative difference %.2e, weighted %.2e"
+          % (cells["rel_diff"].max(),
+             (cells["total_joint"] - cells["total_two_stage"]).abs().sum() / cells["total_two_stage"].sum()))
+
+    exceeded = cells[cells["rel_diff"] > IpfJob.IPF_JOINT_TOLERANCE]
+    if len(exceeded) > 0:
+        print("FAILED: " + str(len(exceeded)) + " cell(s) differ by more than %g%%"
+              % (100 * IpfJob.IPF_JOINT_TOLERANCE))
+        print(exceeded[keys + ["total_two_stage", "total_joint", "rel_diff"]].to_string(index=False))
+        return False
+
+    print("all cells within %g%% of the two-stage result" % (100 * IpfJob.IPF_JOINT_TOLERANCE))
+    return True
+
+
+BENCHMARKS = {"read": benchmark_read,
+              "append": benchmark_append,
+              "pums": benchmark_pums,
+              "ipf": benchmark_ipf,
+              "joint": benchmark_joint}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in BENCHMARKS:
+        print("Usage: python Benchmark.py <" + "|".join(BENCHMARKS) + ">")
+        sys.exit(1)
+
+    # a benchmark that also checks its results returns False when the check fails
+    if BENCHMARKS[sys.argv[1]]() is False:
+        sys.exit(1)
@@ -2,125 +2,211 @@
 # 1. Reads and refines user selected input file
 # 2. Display and output averages of selected variables
 
-import wx
-
 # from CardioIO import CardioIO
 from IO import IO
+from InputSchema import InputSchema
+from ReplicateStats import ReplicateStats
+from ResultStore import ResultStore
+from StatinsScenarios import StatinsScenarios
+from StratumSums import StratumSums
 import pandas as pd
+import copy
+import os
 
 
 class CardioIO(IO):
-    RISK_FACTORS_VARS = ["Age", "SD_Age",
-                         "Tchols", "SD_Tchols",
-                         "LDL", "SD_LDL",
-                         "HDL", "SD_HDL",
-                         "SBP", "SD_SBP",
-                         "Smoking", "Low_Smoke", "Up_Smoke",
-                         "HTN", "Low_HTN", "Up_HTN"]
+    RISK_FACTORS_VARS = InputSchema.get_columns("risk_factors")
 
     # STATINS_VARS = ["Statins_Usage"]
-    STATINS_VARS = ["Pop", "TotalStatinsEligiblePre",
-                    "OnStatinsPre", "NotOnStatinsPre",
-                    "BaselineStatinsUse", "StatinsUsePost",
-                    "RemainingUsePost"]
+    STATINS_VARS = InputSchema.get_columns("statins")
 
-    CHD_VARS = ["Ten_year_CHD"]
+    CHD_VARS = InputSchema.get_columns("total_chd")
 
     STRATA = ['Intervention', 'Time', 'Race_Gender']
     STRATA_STATINS = ['Intervention', 'RaceGender']
 
+    CHUNK_SIZE = 100000
+
     def __init__(self, interface):
 
         super().__init__(interface)
+        self.__ui = interface
+        self.__sums = {}
+        self.__replicates = {}
+        self.__scenarios = StatinsScenarios()
+        self.__results = ResultStore()
 
         self.risk_factor_data = pd.DataFrame()
         self.total_chd_risk = pd.DataFrame()
         self.fatal_chd_risk = pd.DataFrame()
+        self.statins_use = pd.DataFrame()
 
         self.__risk_filename = "mean_risk.csv"
         self.__total_chd_filename = "total_chd.csv"
         self.__fatal_chd_filename = "fatal_chd.csv"
         self.__statins_filename = "statins_use.csv"
+        self.__scenarios_filename = "statins_scenarios.csv"
 
     def read_risk_factors_data(self, file_paths):
         self.setDisplayFlag(True)
-        self.risk_factor_data = self.read(file_paths=file_paths,
-                                          ref_header=CardioIO.RISK_FACTORS_VARS,
-                                          ignore_index=True, index_col="State")
+        self.risk_factor_data = self.__aggregate(kind="risk_factors",
+                                                 file_paths=file_paths,
+                                                 ref_header=CardioIO.RISK_FACTORS_VARS,
+                                                 strata=CardioIO.STRATA,
+                                                 weighted_columns=CardioIO.RISK_FACTORS_VARS)
 
         if self.show():
-            wx.MessageBox("Risk factor files successfully imported!")
-            self.risk_factor_data = self.__calculate(data=self.risk_factor_data, columns=CardioIO.RISK_FACTORS_VARS)
+            self.message("Risk factor files successfully imported!")
 
     def read_total_chd_risk(self, file_paths):
         self.setDisplayFlag(True)
-        self.total_chd_risk = self.read(file_paths=file_paths,
-                                        ref_header=CardioIO.CHD_VARS,
-                                        ignore_index=True, index_col="State")
+        self.total_chd_risk = self.__aggregate(kind="total_chd",
+                                               file_paths=file_paths,
+                                               ref_header=CardioIO.CHD_VARS,
+                                               strata=CardioIO.STRATA,
+                                               weighted_columns=CardioIO.CHD_VARS)
 
         if self.show():
-            wx.MessageBox("Total CHD risk files are successfully imported!")
-            self.total_chd_risk = self.__calculate(data=self.total_chd_risk, columns=CardioIO.CHD_VARS)
+            self.message("Total CHD risk files are successfully imported!")
 
     def read_fatal_chd_risk(self, file_paths):
         self.setDisplayFlag(True)
-        self.fatal_chd_risk = self.read(file_paths=file_paths,
-                                        ref_header=CardioIO.CHD_VARS,
-                                        ignore_index=True, index_col="State")
+        self.fatal_chd_risk = self.__aggregate(kind="fatal_chd",
+                                               file_paths=file_paths,
+                                               ref_header=CardioIO.CHD_VARS,
+                                               strata=CardioIO.STRATA,
+                                               weighted_columns=CardioIO.CHD_VARS)
 
         if self.show():
-            wx.MessageBox("Fatal CHD risk files are successfully imported!")
-            self.fatal_chd_risk = self.__calculate(data=self.fatal_chd_risk, columns=CardioIO.CHD_VARS)
+            self.message("Fatal CHD risk files are successfully imported!")
 
     def read_statins_use(self, file_paths):
         self.setDisplayFlag(True)
-        self.statins_use = self.read(file_paths=file_paths,
-                                     ref_header=CardioIO.STATINS_VARS,
-                                     ignore_index=True, index_col="State")
-
-        # print(self.statins_use)
+        self.statins_use = self.__aggregate(kind="statins",
+                                            file_paths=file_paths,
+                                            ref_header=CardioIO.STATINS_VARS,
+                                            strata=CardioIO.STRATA_STATINS,
+                                            weighted_columns=[])
 
         if self.show():
-            wx.MessageBox("Statins Usage files are successfully imported!")
-            self.statins_use = self.__calculate_statins_use(data=self.statins_use, columns=CardioIO.STATINS_VARS)
+            self.message("Statins Usage files are successfully imported!")
+
+    def read_statins_scenarios(self, file_path):
+        try:
+            self.__scenarios.read(file_path)
+        except (OSError, ValueError) as error:
+            self.message("Error: Cannot read statins scenarios!\n" + str(error))
+            return
+
+        self.message("Statins scenarios successfully imported!")
+
+    def query(self, kind, by_state=False, **keys):
+        return self.__results.query(kind, by_state=by_state, **keys)
 
+    def clear(self):
+        self.__sums = {}
+        self.__replicates = {}
+        self.__results = ResultStore()
+
+        self.risk_factor_data = pd.DataFrame()
+        self.total_chd_risk = pd.DataFrame()
+        self.fatal_chd_risk = pd.DataFrame()
+        self.statins_use = pd.DataFrame()
+
+        self.log("\nImported results cleared.\n")
 
     def output(self):
 
         if not self.risk_factor_data.empty:
-            self.write(self.risk_factor_data,  self.__risk_filename)
+            self.write(self.__add_replicates("risk_factors", self.risk_factor_data),  self.__risk_filename)
 
         if not self.total_chd_risk.empty:
-            self.write(self.total_chd_risk, self.__total_chd_filename)
+            self.write(self.__add_replicates("total_chd", self.total_chd_risk), self.__total_chd_filename)
 
         if not self.fatal_chd_risk.empty:
-            self.write(self.fatal_chd_risk, self.__fatal_chd_filename)
+            self.write(self.__add_replicates("fatal_chd", self.fatal_chd_risk), self.__fatal_chd_filename)
 
         if not self.statins_use.empty:
             self.write(self.statins_use, self.__statins_filename)
 
-    def __calculate(self, data, columns):
-        for col in columns:
-            data[col] *= data.Pop
-
-        data = data.groupby(CardioIO.STRATA).sum()
-
-        for col in columns:
-            data[col] /= data.Pop
-
-        return data
-
-    def __calculate_statins_use(self, data, columns):
-        data = data.groupby(CardioIO.STRATA_STATINS).sum()
-
-        # for col in columns:
-            # data["Percent"] = 100 * (data[col] / data.Pop)
-
-        return data
-
-
-
-
-
-
-
+            try:
+                scenarios = self.__scenarios.evaluate(self.statins_use)
+            except ValueError as error:
+                self.message("Error: Cannot evaluate statins scenarios!\n" + str(error))
+            else:
+                self.write(scenarios, self.__scenarios_filename)
+
+    def __aggregate(self, kind, file_paths, ref_header, strata, weighted_columns):
+        if kind not in self.__sums:
+            self.__sums[kind] = StratumSums(strata=strata, weighted_columns=weighted_columns, level="State")
+        sums = self.__sums[kind]
+
+        # only parse files that haven't been folded into the running sums yet
+        new_paths = []
+        skipped_paths = []
+        modified_paths = []
+        for path in file_paths:
+            path = os.path.abspath(path)
+            if path in new_paths or path in skipped_paths or path in modified_paths:
+                continue
+            elif sums.is_modified(path):
+                modified_paths.append(path)
+            elif sums.has_file(path):
+                skipped_paths.append(path)
+            else:
+                new_paths.append(path)
+
+        if len(modified_paths) > 0:
+            self.message("Error: Files changed since they were imported, clear the imported "
+                         "results before importing them again!\n" + "\n".join(modified_paths))
+            self.setDisplayFlag(False)
+            return sums.get_means()
+
+        self.log("\nImporting " + str(len(new_paths)) + " new file(s), "
+                 + str(len(skipped_paths)) + " already imported...\n")
+        for path in skipped_paths:
+            self.log("Skipped " + path + ", already imported.\n")
+        if len(new_paths) == 0:
+            return sums.get_means()
+
+        # Pop weights every stratum mean, so a file without it must fail before any parsing
+        if not self.check_headers(new_paths, ref_header + ["State", "Pop"] + strata):
+            return sums.get_means()
+
+        # each file is one replicate run, its own per-stratum means feed the replicate statistics
+        replicates = None
+        if len(weighted_columns) > 0:
+            replicates = copy.deepcopy(self.__replicates.get(kind, ReplicateStats(columns=weighted_columns)))
+
+        # fold the new files into a separate batch, so a bad file leaves the totals untouched
+        batch = StratumSums(strata=strata, weighted_columns=weighted_columns, level="State")
+        for path in new_paths:
+            file_sums = StratumSums(strata=strata, weighted_columns=weighted_columns, level="State")
+            file_sums.add_file(path)
+            for chunk in self.read_chunks(path=path, index_col="State",
+                                          chunksize=CardioIO.CHUNK_SIZE,
+                                          dtype=InputSchema.get_dtypes(kind)):
+                file_sums.add(chunk)
+
+            if not self.show():
+                return sums.get_means()
+
+            if replicates is not None:
+                replicates.add(file_sums.get_means())
+
+            batch.merge(file_sums)
+            self.enable_export()
+
+        sums.merge(batch)
+        if replicates is not None:
+            self.__replicates[kind] = replicates
+
+        self.__results.put(kind, sums.get_means())
+        self.__results.put(kind, sums.get_means(by_level=True), by_state=True)
+        return self.__results.get(kind)
+
+    def __add_replicates(self, kind, data):
+        if not self.__ui.replicate_check_box.IsChecked() or kind not in self.__replicates:
+            return data
+
+        return data.join(self.__replicates[kind].get_frame())
@@ -17,6 +17,15 @@ class CardioModel:
     def import_statins_use(self, statins_use_path):
         self.__io.read_statins_use(statins_use_path)
 
+    def import_statins_scenarios(self, scenarios_path):
+        self.__io.read_statins_scenarios(scenarios_path)
+
+    def query(self, kind, by_state=False, **keys):
+        return self.__io.query(kind, by_state=by_state, **keys)
+
+    def clear(self):
+        self.__io.clear()
+
     def output(self):
         self.__io.output()
 
@@ -1,31 +1,76 @@
-import wx
 from IO import IO
+from InputSchema import InputSchema
+from RocExport import RocExport
+from ResultCache import ResultCache
+import numpy as np
+import pandas as pd
 import os
 
 
 class DepressionIO(IO):
     # NHANES_COLUMNS = ["wtmec2yr", "cmark", "depdiagfunc", "depscalescore"]
-    NHANES_COLUMNS = ["age", "agecat1", "agecat2", "gender", "edu",
-                      "wtmec2yr", "cmark", "major", "other", "depscalescore"]
+    NHANES_COLUMNS = InputSchema.get_columns("nhanes")
     PREVALENCE_COLUMNS = ["Preval_Before", "Preval_After"]
     STRATA = ["Sex", "Age_Cat", "Depression_Type"]
 
+    DEMO_COLUMNS = ["SEQN", "SDDSRVYR", "RIDAGEYR", "RIAGENDR", "DMDEDUC2", "WTMEC2YR"]
+    DPQ_ITEMS = ["DPQ010", "DPQ020", "DPQ030", "DPQ040", "DPQ050",
+                 "DPQ060", "DPQ070", "DPQ080", "DPQ090"]
+    NHANES_CYCLES = {5: "E", 6: "F", 7: "G", 8: "H", 9: "I"}
+    AGE_CAT1_BINS = [18, 30, 40, 50, 60, 70, 80]
+    AGE_CAT2_BINS = [18, 40, 60]
+    XPT_CHUNK_SIZE = 50000
+
+    OUTPUT_FORMATS = ["Per-stratum CSV", "Single CSV", "Single Parquet"]
+    SENS_SPEC_FILENAME = "sens_spec_all"
+
     def __init__(self, interface):
         super().__init__(interface)
         self.__cohorts = {}
 
+        self.__nhanes_digest = None
+        self.__cache = ResultCache(os.path.join(self.getCurDir(), ResultCache.CACHE_DIR))
+
     def get_nhanes_data(self):
         return self.__nhanes_data
 
     def set_nhanes_data(self, data):
         self.__nhanes_data = data
+        self.__nhanes_digest = None
 
     def read_nhanes_data(self, file_paths):
         self.setDisplayFlag(True)
-        self.__nhanes_data = self.read(file_paths, DepressionIO.NHANES_COLUMNS,
-                                       ignore_index=True, index_col="Index")
+
+        digest = self.__cache.hash_files(file_paths)
+        if digest == self.__nhanes_digest:
+            self.message("NHANES data unchanged, keeping the imported data!")
+            return
+
+        self.__nhanes_digest = None
+        if self.__is_xpt(file_paths):
+            self.__nhanes_data = self.__read_nhanes_xpt(file_paths)
+        else:
+            self.__nhanes_data = self.read(file_paths, DepressionIO.NHANES_COLUMNS,
+                                           ignore_index=True, index_col="Index",
+                                           dtype=InputSchema.get_dtypes("nhanes"))
         if self.show():
-            wx.MessageBox("NHANES data successfully imported!")
+            self.__nhanes_data = self.__nhanes_data[DepressionIO.NHANES_COLUMNS]
+            self.__nhanes_digest = digest
+            self.message("NHANES data successfully imported!")
+
+    def load_results(self, params):
+        if self.__nhanes_digest is None:
+            return None
+
+        return self.__cache.load(self.__cache.get_key(self.__nhanes_digest, params))
+
+    def store_results(self, params, results):
+        if self.__nhanes_digest is not None:
+            self.__cache.store(self.__cache.get_key(self.__nhanes_digest, params), results)
+
+    def invalidate_results(self):
+        self.__cache.invalidate()
+        self.message("Result cache cleared!")
 
     def read_depression_prevalence(self, file_path):
         self.setDisplayFlag(True)
@@ -33,45 +78,179 @@ class DepressionIO(IO):
                                       ignore_index=True, index_col="State")
 
         if self.show():
-            wx.MessageBox("Depression Prevalence Successfully Imported!")
+            self.message("Depression Prevalence Successfully Imported!")
             self.__prevalence = self.__calculate(data=self.__prevalence)
 
-    def output_by_cohorts(self, data, cohorts):
+    def output_by_cohorts(self, data, cohorts, gold_std):
         for cohort in cohorts:
-            filename = "sens_spec_" + cohort + ".csv"
+            filename = "sens_spec_" + cohort + "_" + gold_std + ".csv"
             self.write_data(data[cohort], filename)
 
-    def output_by_age_gender(self, data, num_age, num_sex):
+    def output_by_age_gender(self, data, num_age, num_sex, gold_std):
         for sex in range(num_sex):
             for age in range(num_age):
                 sex_age = (sex+1, age+1)
-                filename = "sens_spec_" + str(sex+1) + str(age+1) + ".csv"
+                filename = "sens_spec_" + str(sex+1) + str(age+1) + "_" + gold_std + ".csv"
                 self.write_data(data[sex_age], filename)
 
+    def output_sens_spec_table(self, data, fmt):
+        if not self.show():
+            self.message("Error: Cannot export file!")
+            return
+
+        table = self.__to_long_table(data)
+
+        if fmt == "Single Parquet":
+            filename = DepressionIO.SENS_SPEC_FILENAME + ".parquet"
+            try:
+                table.to_parquet(os.path.join(self.getCurDir(), filename), index=False)
+            except ImportError:
+                self.message("Error: Parquet export requires pyarrow or fastparquet!")
+                return
+        else:
+            filename = DepressionIO.SENS_SPEC_FILENAME + ".csv"
+            table.to_csv(os.path.join(self.getCurDir(), filename), index=False)
+
+        self.message("Success: " + filename + " File exported!")
+
     def output_depression_prevalence(self):
         self.write(data=self.__prevalence, filename="Prevalence_US.csv")
 
     def write_data(self, data, filename):
         if not self.show():
-            wx.MessageBox("Error: Cannot export file!")
+            self.message("Error: Cannot export file!")
         else:
             out_path = os.path.join(self.getCurDir(), filename)
             if os.path.isfile(out_path):
                 open(out_path, "w").close()
 
+            columns = ["Sensitivity", "Specificity"]
+            for item in data.values():
+                columns = list(item.keys())
+                break
+
             file = open(out_path, "a")
-            file.write("Score,Sensitivity,Specificity\n")
+            file.write("Score," + ",".join(columns) + "\n")
 
             for key, item in data.items():
                 cut_off_score = str(key)
-                sens = str(item["Sensitivity"])
-                spec = str(item["Specificity"])
+                values = [str(item[col]) for col in columns]
 
-                file.write(cut_off_score + "," +
-                           sens + "," + spec + "\n")
+                file.write(cut_off_score + "," + ",".join(values) + "\n")
 
             file.close()
-            wx.MessageBox("Success: " + filename + " File exported!")
+            self.message("Success: " + filename + " File exported!")
+
+    def write_roc_figures(self, figures):
+        if not self.show():
+            self.message("Error: Cannot export file!")
+        else:
+            exported = RocExport(self.getCurDir()).export(figures)
+            self.message("Success: " + str(len(exported)) + " ROC figures exported, "
+                          + str(len(figures) - len(exported)) + " unchanged!")
+
+    def __is_xpt(self, file_paths):
+        for path in file_paths:
+            if not path.lower().endswith(".xpt"):
+                return False
+
+        return True
+
+    def __read_nhanes_xpt(self, file_paths):
+        demo = []
+        dpq = []
+        for path in file_paths:
+            filename = os.path.basename(path).upper()
+            if filename.startswith("DEMO"):
+                demo.append(self.__read_xpt(path, DepressionIO.DEMO_COLUMNS))
+            elif filename.startswith("DPQ"):
+                dpq.append(self.__read_xpt(path, ["SEQN"] + DepressionIO.DPQ_ITEMS))
+            else:
+                self.message("Error: Not a DEMO or DPQ file\n" + path)
+                self.setDisplayFlag(False)
+
+            if not self.show():
+                return pd.DataFrame()
+
+        if len(demo) == 0 or len(dpq) == 0:
+            self.message("Error: Both DEMO and DPQ files must be selected!")
+            self.setDisplayFlag(False)
+            return pd.DataFrame()
+
+        data = pd.merge(pd.concat(demo, ignore_index=True), pd.concat(dpq, ignore_index=True),
+                        on="SEQN", how="inner")
+
+        self.enable_export()
+        return self.__derive_nhanes_columns(data)
+
+    def __read_xpt(self, path, columns):
+        chunks = []
+        with pd.read_sas(path, format="xport", chunksize=DepressionIO.XPT_CHUNK_SIZE) as reader:
+            for chunk in reader:
+                if not set(columns).issubset(chunk.columns):
+                    self.message("Error: One or more columns are missing in\n" + path)
+                    self.setDisplayFlag(False)
+                    return None
+
+                chunks.append(chunk[columns])
+
+        return pd.concat(chunks, ignore_index=True)
+
+    def __derive_nhanes_columns(self, data):
+        # SAS transport stores zero as a tiny denormal, so round the coded columns
+        codes = ["SDDSRVYR", "RIDAGEYR", "RIAGENDR", "DMDEDUC2"] + DepressionIO.DPQ_ITEMS
+        data = data.assign(**data[codes].round(0))
+
+        # 7 (refused) and 9 (don't know) are not valid item responses
+        items = data[DepressionIO.DPQ_ITEMS]
+        items = items.where(items <= 3)
+
+        score = items.sum(axis=1, min_count=len(DepressionIO.DPQ_ITEMS))
+        complete = score.notna()
+
+        # PHQ-9 algorithm: items 1-8 count at "more than half the days", item 9 at any frequency
+        symptoms = (items[DepressionIO.DPQ_ITEMS[:-1]] >= 2).sum(axis=1) + (items["DPQ090"] >= 1)
+        cardinal = (items["DPQ010"] >= 2) | (items["DPQ020"] >= 2)
+
+        age = data["RIDAGEYR"].to_numpy(dtype=float)
+        edu = data["DMDEDUC2"].to_numpy(dtype=float)
+
+        nhanes_data = pd.DataFrame({
+            "age": age,
+            "agecat1": self.__get_category(age, DepressionIO.AGE_CAT1_BINS),
+            "agecat2": self.__get_category(age, DepressionIO.AGE_CAT2_BINS),
+            "gender": data["RIAGENDR"].to_numpy(dtype=float),
+            "edu": np.select([(edu >= 1) & (edu <= 3), (edu >= 4) & (edu <= 5)], [1, 2], np.nan),
+            "wtmec2yr": data["WTMEC2YR"].to_numpy(dtype=float),
+            "cmark": data["SDDSRVYR"].map(DepressionIO.NHANES_CYCLES).to_numpy(),
+            "major": np.where(complete, cardinal & (symptoms >= 5), np.nan),
+            "other": np.where(complete, cardinal & (symptoms >= 2) & (symptoms <= 4), np.nan),
+            "depscalescore": score.to_numpy()})
+        nhanes_data.index.name = "Index"
+
+        return nhanes_data.astype(InputSchema.get_dtypes("nhanes"))
+
+    def __get_category(self, values, bins):
+        categories = np.digitize(values, bins).astype(float)
+        categories[(categories == 0) | np.isnan(values)] = np.nan
+
+        return categories
+
+    def __to_long_table(self, data):
+        columns = {"Gold_Standard": [], "Stratum": [], "Score": []}
+        for gold_std, sens_spec in data.items():
+            for stratum, scores in sens_spec.items():
+                if isinstance(stratum, tuple):
+                    stratum = "".join([str(key) for key in stratum])
+
+                for score, item in scores.items():
+                    columns["Gold_Standard"].append(gold_std)
+                    columns["Stratum"].append(stratum)
+                    columns["Score"].append(score)
+                    for col, value in item.items():
+                        columns.setdefault(col, []).append(value)
+
+        return pd.DataFrame(columns)
 
     def __calculate(self, data):
         data.Preval_Before *= data.Pop_Before
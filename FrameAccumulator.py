@@ -0,0 +1,25 @@
+import pandas as pd
+
+
+class FrameAccumulator:
+    def __init__(self, ignore_index=True):
+        self.__ignore_index = ignore_index
+        self.__parts = []
+
+    def append(self, data):
+        if not data.empty:
+            self.__parts.append(data)
+
+    def extend(self, frames):
+        for data in frames:
+            self.append(data)
+
+    def get_frame(self):
+        if len(self.__parts) == 0:
+            return pd.DataFrame()
+
+        # concatenate once, then keep the result so repeated reads stay cheap
+        if len(self.__parts) > 1:
+            self.__parts = [pd.concat(self.__parts, ignore_index=self.__ignore_index)]
+
+        return self.__parts[0]
@@ -1,9 +1,37 @@
+from concurrent.futures import as_completed
+from FrameAccumulator import FrameAccumulator
+from ProcessPool import ProcessPool
 import pandas as pd
 import wx
 import os
 
 
+def _parse_csv(path, index_col, usecols, ref_header, dtype):
+    try:
+        data = pd.read_csv(path, index_col=index_col, usecols=usecols, dtype=dtype)
+    except ValueError:
+        return None
+
+    if ref_header is not None:
+        data.columns = [col.strip() for col in data.columns]
+
+    return data
+
+
+def _read_header(path):
+    try:
+        header = pd.read_csv(path, nrows=0).columns
+    except (OSError, ValueError):
+        return None
+
+    return set([str(col).strip() for col in header])
+
+
 class IO:
+    # starting a pool costs more than it saves unless there are many large files and several
+    # cores, so reads are serial unless the caller asks for workers
+    READ_WORKERS = 1
+
     def __init__(self, interface):
         self.display = True
         self.__curDir = os.getcwd()
@@ -18,46 +46,73 @@ class IO:
     def show(self):
         return self.display
 
-    def read(self, file_paths, ref_header, ignore_index, index_col):
-        df = pd.DataFrame()
+    def read(self, file_paths, ref_header, ignore_index, index_col, workers=None, dtype=None):
+        required = list(ref_header)
+        if isinstance(index_col, str):
+            required.append(index_col)
+
+        if not self.check_headers(file_paths, required):
+            return pd.DataFrame()
+
+        frames = self.__parse_files(file_paths, index_col=index_col, usecols=None,
+                                    ref_header=ref_header, dtype=dtype, workers=workers)
+        if frames is None:
+            return pd.DataFrame()
+
+        self.enable_export()
+        return self.__combine(frames, ignore_index=ignore_index)
+
+    def read_chunks(self, path, index_col, chunksize, dtype=None, usecols=None):
+        with pd.read_csv(path, index_col=index_col, usecols=usecols,
+                         chunksize=chunksize, dtype=dtype) as reader:
+            while True:
+                try:
+                    data = next(reader)
+                except StopIteration:
+                    return
+                except ValueError:
+                    self.__missing_columns(path)
+                    return
+
+                data.columns = [col.strip() for col in data.columns]
+                yield data
+
+    def check_headers(self, file_paths, ref_header):
+        required = set(ref_header)
+
+        errors = []
         for path in file_paths:
-            data = pd.read_csv(path, index_col=index_col)
-            data.columns = [col.strip() for col in data.columns]
-
-            if not self.__exists(header1=data.columns, header2=ref_header):
-                wx.MessageBox("Error: One or more columns are missing in\n" + path)
-                self.display = False
-                break
-            else:
-                if df.empty:
-                    df = data
-                else:
-                    df = df.append(data, ignore_index=ignore_index)
+            header = _read_header(path)
+            if header is None:
+                errors.append(path + " (unreadable)")
+            elif not required <= header:
+                errors.append(path + " (" + ", ".join(sorted(required - header)) + ")")
+
+        if len(errors) > 0:
+            self.message("Error: One or more columns are missing in\n" + "\n".join(errors))
+            self.display = False
+            return False
 
-                self.enable_export()
+        return True
 
-        return df
+    def read_csv(self, file_paths, columns, ignore_index, workers=None, dtype=None):
+        usecols = columns if len(columns) > 0 else None
+        if not self.check_headers(file_paths, columns):
+            return pd.DataFrame()
 
-    def read_csv(self, file_paths, columns, ignore_index):
-        df = pd.DataFrame()
-        for path in file_paths:
-            if len(columns) > 0:
-                data = pd.read_csv(path, usecols=columns)
-            else:
-                data = pd.read_csv(path)
-
-            if df.empty:
-                df = data
-            else:
-                df = df.append(data, ignore_index=ignore_index)
+        frames = self.__parse_files(file_paths, index_col=None, usecols=usecols,
+                                    ref_header=None, dtype=dtype, workers=workers)
+        if frames is None:
+            return pd.DataFrame()
 
+        if len(frames) > 0:
             self.enable_export()
 
-        return df
+        return self.__combine(frames, ignore_index=ignore_index)
 
     def write(self, data, filename, append=False):
         if not self.display:
-            wx.MessageBox("Error: Cannot export file!")
+            self.message("Error: Cannot export file!")
         else:
             out_path = os.path.join(self.__curDir, filename)
             if os.path.isfile(out_path):
@@ -67,20 +122,64 @@ class IO:
                 data.to_csv(out_path, index=True)
             else:
                 data.to_csv(out_path, mode="a", index=True)
-            wx.MessageBox("Success: " + filename + " exported!")
+            self.message("Success: " + filename + " exported!")
+
+    def __parse_files(self, file_paths, index_col, usecols, ref_header, dtype, workers):
+        if workers is None:
+            workers = IO.READ_WORKERS
+        workers = min(workers, len(file_paths))
+
+        frames = [None] * len(file_paths)
+
+        if workers <= 1:
+            for idx, path in enumerate(file_paths):
+                frames[idx] = _parse_csv(path, index_col, usecols, ref_header, dtype)
+                if frames[idx] is None:
+                    self.__missing_columns(path)
+                    return None
+
+            return frames
+
+        # parse concurrently, but keep the results in input order
+        executor = ProcessPool.create(max_workers=workers)
+        try:
+            futures = {}
+            for idx, path in enumerate(file_paths):
+                futures[executor.submit(_parse_csv, path, index_col, usecols,
+                                        ref_header, dtype)] = idx
+
+            for future in as_completed(futures):
+                idx = futures[future]
+                frames[idx] = future.result()
+                if frames[idx] is None:
+                    self.__missing_columns(file_paths[idx])
+                    return None
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return frames
+
+    def __combine(self, frames, ignore_index):
+        accumulator = FrameAccumulator(ignore_index=ignore_index)
+        accumulator.extend(frames)
+        return accumulator.get_frame()
+
+    def __missing_columns(self, path):
+        self.message("Error: One or more columns are missing or malformed in\n" + path)
+        self.display = False
+
+    def message(self, text):
+        self.__call_ui(wx.MessageBox, text)
+
+    def log(self, text):
+        self.__call_ui(self.__ui.display_text_box.AppendText, text)
 
-    def __exists(self, header1, header2):
-        count = 0
-        for col1 in header1:
-            for col2 in header2:
-                if col1 == col2:
-                    count += 1
+    def enable_export(self):
+        self.__call_ui(self.__ui.export_button.Enable)
 
-        if count == len(header2):
-            return True
+    def __call_ui(self, function, *args):
+        # imports and exports run on worker threads, widgets may only be touched on the main one
+        if wx.IsMainThread():
+            function(*args)
         else:
-            return False
-
-    def enable_export(self):
-        if not self.__ui.export_button.IsEnabled():
-            self.__ui.export_button.Enable()
\ No newline at end of file
+            wx.CallAfter(function, *args)
\ No newline at end of file
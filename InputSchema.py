@@ -0,0 +1,64 @@
+# Declared column dtypes for every input kind, so parsing skips type inference
+# and string strata are read straight into categoricals. Only codes and counts are
+# narrowed, measured values stay float64 so they are written back out as read
+
+
+class InputSchema:
+    CARDIO_STRATA = {"State": "category",
+                     "Intervention": "category",
+                     "Time": "int16",
+                     "Race_Gender": "category",
+                     "Pop": "int32"}
+
+    STATINS_STRATA = {"State": "category",
+                      "Intervention": "category",
+                      "RaceGender": "category",
+                      "Pop": "int32"}
+
+    RISK_FACTORS = {"Age": "float64", "SD_Age": "float64",
+                    "Tchols": "float64", "SD_Tchols": "float64",
+                    "LDL": "float64", "SD_LDL": "float64",
+                    "HDL": "float64", "SD_HDL": "float64",
+                    "SBP": "float64", "SD_SBP": "float64",
+                    "Smoking": "float64", "Low_Smoke": "float64", "Up_Smoke": "float64",
+                    "HTN": "float64", "Low_HTN": "float64", "Up_HTN": "float64"}
+
+    STATINS = {"Pop": "int32",
+               "TotalStatinsEligiblePre": "float64",
+               "OnStatinsPre": "float64", "NotOnStatinsPre": "float64",
+               "BaselineStatinsUse": "float64", "StatinsUsePost": "float64",
+               "RemainingUsePost": "float64"}
+
+    CHD = {"Ten_year_CHD": "float64"}
+
+    # codes that can be missing are float32, which holds small integers exactly,
+    # gender is nullable since not every demographics record has it
+    NHANES = {"age": "float32",
+              "agecat1": "float32", "agecat2": "float32",
+              "gender": "Int8", "edu": "float32",
+              "wtmec2yr": "float64",
+              "cmark": "category",
+              "major": "float32", "other": "float32",
+              "depscalescore": "float64"}
+
+    PUMS = {"PWGTP": "int32", "AGEP": "int8", "SEX": "int8",
+            "RAC1P": "int8", "HISP": "int8",
+            "SCHL": "float32", "PINCP": "float32"}
+
+    SCHEMAS = {"risk_factors": (CARDIO_STRATA, RISK_FACTORS),
+               "total_chd": (CARDIO_STRATA, CHD),
+               "fatal_chd": (CARDIO_STRATA, CHD),
+               "statins": (STATINS_STRATA, STATINS),
+               "nhanes": ({}, NHANES),
+               "pums": ({}, PUMS)}
+
+    @staticmethod
+    def get_columns(kind):
+        return list(InputSchema.SCHEMAS[kind][1])
+
+    @staticmethod
+    def get_dtypes(kind):
+        strata, columns = InputSchema.SCHEMAS[kind]
+        dtypes = dict(strata)
+        dtypes.update(columns)
+        return dtypes
@@ -6,7 +6,9 @@ import time
 from collections import OrderedDict
 from CardioModel import CardioModel
 from DepressionModel import DepressionModel
+from DepressionIO import DepressionIO
 from ACSRefiner import ACSRefiner
+from Loader import Loader
 
 
 class Interface(wx.Frame):
@@ -21,6 +23,8 @@ class Interface(wx.Frame):
 
     def initialize(self):
         self.window = wx.Panel(self)
+        self.loader = Loader(self)
+        self.Bind(wx.EVT_CLOSE, self.__close)
 
         self.parent_box = wx.BoxSizer(wx.HORIZONTAL)
         self.left_box = wx.BoxSizer(wx.VERTICAL)
@@ -95,7 +99,7 @@ class Interface(wx.Frame):
 
     def __create_cardio_menu(self):
 
-        sizer = wx.GridSizer(4, 2, 10, 10)
+        sizer = wx.GridSizer(6, 2, 10, 10)
 
         self.mean_check_box = wx.CheckBox(self.window, label="Mean of risk factors")
         self.mean_check_box.Bind(wx.EVT_CHECKBOX, self.__enableMeanRiskImport)
@@ -125,16 +129,27 @@ class Interface(wx.Frame):
         self.import_btn4.Disable()
         self.import_btn4.Bind(wx.EVT_BUTTON, self.__import_statins_use)
 
+        self.replicate_check_box = wx.CheckBox(self.window, label="Replicate distribution (per file)")
+
+        self.import_scenarios_btn = wx.Button(self.window, label="Import statins scenarios", size=(400, 40))
+        self.import_scenarios_btn.Disable()
+        self.import_scenarios_btn.Bind(wx.EVT_BUTTON, self.__import_statins_scenarios)
+
+        self.clear_imports_btn = wx.Button(self.window, label="Clear imported results", size=(400, 40))
+        self.clear_imports_btn.Bind(wx.EVT_BUTTON, self.__clear_cardio_imports)
+
         sizer.AddMany([self.mean_check_box, (self.import_btn1, 1, wx.EXPAND),
                        self.total_risk_check_box, (self.import_btn2, 1, wx.EXPAND),
                        self.fatal_risk_check_box, (self.import_btn3, 1, wx.EXPAND),
-                       self.statins_check_box, (self.import_btn4, 1, wx.EXPAND)])
+                       self.statins_check_box, (self.import_btn4, 1, wx.EXPAND),
+                       self.replicate_check_box, (self.import_scenarios_btn, 1, wx.EXPAND),
+                       (0, 0), (self.clear_imports_btn, 1, wx.EXPAND)])
 
         self.left_box.Add(sizer, flag=wx.EXPAND | wx.ALL, border=15)
         self.__hide_cardio_menu()
 
     def __create_depression_menu(self):
-        sizer1 = wx.GridSizer(2, 2, 10, 10)
+        sizer1 = wx.GridSizer(4, 2, 10, 10)
         sizer2 = wx.GridSizer(2, 3, 10, 10)
 
         self.nhanes_check_box = wx.CheckBox(self.window, label="NHANES Cohort")
@@ -151,6 +166,15 @@ class Interface(wx.Frame):
         self.import_preval_btn.Disable()
         self.import_preval_btn.Bind(wx.EVT_BUTTON, self.__import_depression_prevalence)
 
+        self.roc_check_box = wx.CheckBox(self.window, label="ROC (all thresholds)")
+        self.roc_check_box.Bind(wx.EVT_CHECKBOX, self.__select_roc)
+        self.bootstrap_check_box = wx.CheckBox(self.window, label="Bootstrap confidence intervals")
+        self.bootstrap_check_box.Bind(wx.EVT_CHECKBOX, self.__select_bootstrap)
+
+        self.output_format_text = wx.StaticText(self.window, label="Output format")
+        self.output_format_choice = wx.Choice(self.window, choices=DepressionIO.OUTPUT_FORMATS)
+        self.output_format_choice.SetSelection(0)
+
         self.roc_text = wx.StaticText(self.window, label="Select Cohorts")
 
         self.cohortE_check_box = wx.CheckBox(self.window, label="Cohort E")
@@ -177,8 +201,17 @@ class Interface(wx.Frame):
         self.plot_roc_button.Bind(wx.EVT_BUTTON, self.__plot_roc_curve)
         self.plot_roc_button.Disable()
 
+        self.export_roc_button = wx.Button(self.window, label="Export all ROC curves", size=(200, 40))
+        self.export_roc_button.Bind(wx.EVT_BUTTON, self.__export_roc_curves)
+        self.export_roc_button.Disable()
+
+        self.clear_cache_button = wx.Button(self.window, label="Clear result cache", size=(200, 40))
+        self.clear_cache_button.Bind(wx.EVT_BUTTON, self.__clear_result_cache)
+
         sizer1.AddMany([self.nhanes_check_box, (self.import_nhanes_btn, 1, wx.EXPAND),
-                        self.prevalence_check_box, (self.import_preval_btn, 1, wx.EXPAND)])
+                        self.prevalence_check_box, (self.import_preval_btn, 1, wx.EXPAND),
+                        self.roc_check_box, self.bootstrap_check_box,
+                        self.output_format_text, (self.output_format_choice, 1, wx.EXPAND)])
         sizer2.AddMany([self.cohortE_check_box, self.cohortF_check_box, self.cohortG_check_box,
                         self.cohortH_check_box, self.cohortI_check_box])
 
@@ -186,11 +219,13 @@ class Interface(wx.Frame):
         self.left_box.Add(self.roc_text, flag=wx.LEFT | wx.RIGHT, border=20)
         self.left_box.Add(sizer2, flag=wx.EXPAND | wx.ALL, border=20)
         self.left_box.Add(self.plot_roc_button, flag=wx.EXPAND | wx.LEFT | wx.RIGHT, border=20)
+        self.left_box.Add(self.export_roc_button, flag=wx.EXPAND | wx.ALL, border=20)
+        self.left_box.Add(self.clear_cache_button, flag=wx.EXPAND | wx.LEFT | wx.RIGHT, border=20)
 
         self.__hide_depression_menu()
 
     def __create_acs_refiner_menu(self):
-        sizer = wx.GridSizer(2, 3, 10, 10)
+        sizer = wx.GridSizer(3, 3, 10, 10)
 
         self.pop_count_cb = wx.CheckBox(self.window, label="Compute population weights")
         self.pop_count_cb.Bind(wx.EVT_CHECKBOX, self.__enable_acs_import_button)
@@ -214,8 +249,12 @@ class Interface(wx.Frame):
         self.import_marginals_btn.Disable()
         self.import_marginals_btn.Bind(wx.EVT_BUTTON, self.__import_marginals)
 
+        self.joint_ipf_cb = wx.CheckBox(self.window, label="Joint raking (one pass)")
+        self.joint_ipf_cb.Disable()
+
         sizer.AddMany([self.pop_count_cb, (self.col_selection_btn, 1, wx.EXPAND),(self.import_acs_btn, 1, wx.EXPAND),
-                       self.ipf_cb, (self.import_pums_btn, 1, wx.EXPAND), (self.import_marginals_btn, 1, wx.EXPAND)])
+                       self.ipf_cb, (self.import_pums_btn, 1, wx.EXPAND), (self.import_marginals_btn, 1, wx.EXPAND),
+                       self.joint_ipf_cb])
 
         self.left_box.Add(sizer, flag=wx.EXPAND | wx.ALL, border=20)
 
@@ -262,6 +301,10 @@ class Interface(wx.Frame):
         self.statins_check_box.Show()
         self.import_btn4.Show()
 
+        self.replicate_check_box.Show()
+        self.import_scenarios_btn.Show()
+        self.clear_imports_btn.Show()
+
     def __hide_cardio_menu(self):
         self.mean_check_box.Hide()
         self.import_btn1.Hide()
@@ -275,12 +318,20 @@ class Interface(wx.Frame):
         self.statins_check_box.Hide()
         self.import_btn4.Hide()
 
+        self.replicate_check_box.Hide()
+        self.import_scenarios_btn.Hide()
+        self.clear_imports_btn.Hide()
+
     def __display_depression_menu(self):
         self.nhanes_check_box.Show()
         self.import_nhanes_btn.Show()
 
         self.prevalence_check_box.Show()
         self.import_preval_btn.Show()
+        self.roc_check_box.Show()
+        self.bootstrap_check_box.Show()
+        self.output_format_text.Show()
+        self.output_format_choice.Show()
 
         self.roc_text.Show()
         self.cohortE_check_box.Show()
@@ -289,6 +340,8 @@ class Interface(wx.Frame):
         self.cohortH_check_box.Show()
         self.cohortI_check_box.Show()
         self.plot_roc_button.Show()
+        self.export_roc_button.Show()
+        self.clear_cache_button.Show()
 
     def __hide_depression_menu(self):
         self.nhanes_check_box.Hide()
@@ -296,6 +349,10 @@ class Interface(wx.Frame):
 
         self.prevalence_check_box.Hide()
         self.import_preval_btn.Hide()
+        self.roc_check_box.Hide()
+        self.bootstrap_check_box.Hide()
+        self.output_format_text.Hide()
+        self.output_format_choice.Hide()
 
         self.roc_text.Hide()
         self.cohortE_check_box.Hide()
@@ -304,6 +361,8 @@ class Interface(wx.Frame):
         self.cohortH_check_box.Hide()
         self.cohortI_check_box.Hide()
         self.plot_roc_button.Hide()
+        self.export_roc_button.Hide()
+        self.clear_cache_button.Hide()
 
     def __display_acs_refiner_menu(self):
         self.pop_count_cb.Show()
@@ -313,6 +372,7 @@ class Interface(wx.Frame):
         self.ipf_cb.Show()
         self.import_pums_btn.Show()
         self.import_marginals_btn.Show()
+        self.joint_ipf_cb.Show()
 
     def __hide_acs_refiner_menu(self):
         self.pop_count_cb.Hide()
@@ -322,37 +382,52 @@ class Interface(wx.Frame):
         self.ipf_cb.Hide()
         self.import_pums_btn.Hide()
         self.import_marginals_btn.Hide()
+        self.joint_ipf_cb.Hide()
 
     def __import_mean_risks(self, event):
         mean_risk_path = self.__import_files()
 
         if len(mean_risk_path) > 0:
-            self.cardio_model.import_risk_factor(mean_risk_path)
+            self.loader.submit("risk factor files", self.cardio_model.import_risk_factor, mean_risk_path)
 
     def __import_total_chd(self, event):
         total_risk_path = self.__import_files()
         if len(total_risk_path) > 0:
-            self.cardio_model.import_total_chd(total_risk_path)
+            self.loader.submit("total CHD risk files", self.cardio_model.import_total_chd, total_risk_path)
 
     def __import_fatal_chd(self, event):
         fatal_risk_path = self.__import_files()
         if len(fatal_risk_path) > 0:
-            self.cardio_model.import_fatal_chd(fatal_risk_path)
+            self.loader.submit("fatal CHD risk files", self.cardio_model.import_fatal_chd, fatal_risk_path)
 
     def __import_statins_use(self, event):
         statins_use_path = self.__import_files()
         if len(statins_use_path) > 0:
-            self.cardio_model.import_statins_use(statins_use_path)
+            self.loader.submit("statins usage files", self.cardio_model.import_statins_use, statins_use_path)
+
+    def __import_statins_scenarios(self, event):
+        scenarios_path = self.__import_files()
+        if len(scenarios_path) > 0:
+            self.loader.submit("statins scenarios", self.cardio_model.import_statins_scenarios,
+                               scenarios_path[0])
+
+    def __clear_cardio_imports(self, event):
+        if self.loader.is_busy():
+            wx.MessageBox("Error: Wait for the imports to finish before clearing them!")
+            return
+
+        self.cardio_model.clear()
 
     def __import_nhanes_data(self, event):
         nhanes_data_path = self.__import_files()
         if len(nhanes_data_path) > 0:
-            self.depression_model.import_nhanes(nhanes_data_path)
+            self.loader.submit("NHANES data", self.depression_model.import_nhanes, nhanes_data_path)
 
     def __import_depression_prevalence(self, event):
         preval_data_path = self.__import_files()
         if len(preval_data_path) > 0:
-            self.depression_model.import_depression_preval(preval_data_path)
+            self.loader.submit("depression prevalence", self.depression_model.import_depression_preval,
+                               preval_data_path)
 
     def __select_columns_acs(self, event):
         dialog_box = wx.Dialog(self, title="Select one or more columns", size=(900, 350))
@@ -405,21 +480,23 @@ class Interface(wx.Frame):
         acs_path = self.__import_files()
         # print(acs_path)
         if len(acs_path) > 0:
-            self.acs_refiner.import_acs(acs_path, self.selected_columns, self.column_dictionary)
+            self.loader.submit("ACS data", self.acs_refiner.import_acs, acs_path,
+                               list(self.selected_columns), dict(self.column_dictionary))
 
     def __import_pums_file(self, event):
         pums_file_paths = self.__import_files()
         if len(pums_file_paths) > 0:
-            self.acs_refiner.import_pums(pums_file_paths)
+            self.loader.submit("PUMS files", self.acs_refiner.import_pums, pums_file_paths)
 
     def __import_marginals(self, event):
         marginal_file_paths = self.__import_files()
         if len(marginal_file_paths) > 0:
             self.import_marginals_btn.Disable()
-            self.acs_refiner.import_marginals(marginal_file_paths)
+            self.loader.submit("marginals", self.acs_refiner.import_marginals, marginal_file_paths)
 
     def __import_files(self):
         wildcards = "CSV files (*.csv) | *.csv|"\
+                    "SAS transport files (*.xpt) | *.xpt;*.XPT|"\
                     "All files (*.*) | *.*"
 
         file_dialog = wx.FileDialog(self, message="Choose a file",
@@ -442,7 +519,16 @@ class Interface(wx.Frame):
 
         return paths
 
+    def __close(self, event):
+        # drop the queued imports, the one already running can't be interrupted
+        self.loader.shutdown(wait=False)
+        event.Skip()
+
     def __export_files(self, event):
+        if self.loader.is_busy():
+            wx.CallAfter(self.display_text_box.AppendText, "Waiting for imports to finish...\n")
+            self.loader.wait()
+
         if self.model_name == "Cardio Model":
             self.cardio_model.output()
             time.sleep(3)
@@ -485,8 +571,10 @@ class Interface(wx.Frame):
     def __enableStatinsUseImport(self, event):
         if self.statins_check_box.IsChecked():
             self.import_btn4.Enable()
+            self.import_scenarios_btn.Enable()
         else:
             self.import_btn4.Disable()
+            self.import_scenarios_btn.Disable()
 
 
     def __enableNHANESImport(self, event):
@@ -501,12 +589,22 @@ class Interface(wx.Frame):
         else:
             self.import_preval_btn.Disable()
 
+    def __select_roc(self, event):
+        # ROC covers every threshold without intervals, so it can't be combined with bootstrapping
+        if self.roc_check_box.IsChecked():
+            self.bootstrap_check_box.SetValue(False)
+
+    def __select_bootstrap(self, event):
+        if self.bootstrap_check_box.IsChecked():
+            self.roc_check_box.SetValue(False)
+
     def __enable_cohort_check_box(self):
         self.cohortE_check_box.Enable()
         self.cohortF_check_box.Enable()
         self.cohortG_check_box.Enable()
         self.cohortH_check_box.Enable()
         self.cohortI_check_box.Enable()
+        self.export_roc_button.Enable()
 
     def __enable_plot_button(self, event):
         if self.__isCohortChecked():
@@ -526,13 +624,22 @@ class Interface(wx.Frame):
         if self.ipf_cb.IsChecked():
             self.import_pums_btn.Enable()
             self.import_marginals_btn.Enable()
+            self.joint_ipf_cb.Enable()
         else:
             self.import_pums_btn.Disable()
             self.import_marginals_btn.Disable()
+            self.joint_ipf_cb.Disable()
 
     def __plot_roc_curve(self, event):
         self.depression_model.plot_roc()
 
+    def __clear_result_cache(self, event):
+        self.depression_model.clear_cache()
+
+    def __export_roc_curves(self, event):
+        thread = td.Thread(target=self.depression_model.export_roc)
+        thread.start()
+
     def __add_columns(self, event):
         left_indexes = self.__get_column_index(self.list_box_left)
         for index in left_indexes:
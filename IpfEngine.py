@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+
+class IpfEngine:
+    # same stopping rules as ipfn: margins within TOLERANCE of their targets, or no longer improving
+    TOLERANCE = 1e-5
+    RATE_TOLERANCE = 1e-8
+    MAX_ITERATIONS = 500
+    DTYPE = np.float64
+
+    def __init__(self, seed, aggregates, dimensions, weight_col="total", tolerance=TOLERANCE,
+                 max_iterations=MAX_ITERATIONS, dtype=DTYPE, rate_tolerance=RATE_TOLERANCE):
+        self.__seed = seed
+        self.__aggregates = aggregates
+        self.__dimensions = dimensions
+        self.__weight_col = weight_col
+        self.__tolerance = tolerance
+        self.__max_iterations = max_iterations
+        self.__dtype = np.dtype(dtype)
+        self.__rate_tolerance = rate_tolerance
+
+    def iteration(self, ui):
+        axes = []
+        for features in self.__dimensions:
+            for feature in features:
+                if feature not in axes:
+                    axes.append(feature)
+
+        # one axis per stratum, seed rows land in their cell of the dense tensor
+        codes = []
+        categories = []
+        for feature in axes:
+            feature_codes, feature_categories = pd.factorize(self.__seed[feature], sort=True)
+            codes.append(feature_codes)
+            categories.append(feature_categories)
+
+        shape = tuple([len(feature_categories) for feature_categories in categories])
+        cells = np.ravel_multi_index(codes, shape)
+        weights = self.__seed[self.__weight_col].to_numpy(dtype=float)
+
+        seed = np.bincount(cells, weights=weights, minlength=int(np.prod(shape))).reshape(shape)
+        tensor = seed.astype(self.__dtype)
+
+        margins = [self.__get_margin(features, aggregate, axes, categories)
+                   for features, aggregate in zip(self.__dimensions, self.__aggregates)]
+
+        iterations = 0
+        conv = np.inf
+        old_conv = -np.inf
+        while iterations < self.__max_iterations and conv > self.__tolerance \
+                and abs(conv - old_conv) > self.__rate_tolerance:
+            old_conv = conv
+            for other_axes, target in margins:
+                current = tensor.sum(axis=other_axes, keepdims=True)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    factor = np.where(current > 0, target / current, 0)
+                # categories without a target are left as they are
+                tensor *= np.where(np.isnan(target), 1, factor).astype(self.__dtype)
+
+            conv = self.__get_conv(tensor, margins)
+            iterations += 1
+
+        if conv <= self.__tolerance or abs(conv - old_conv) <= self.__rate_tolerance:
+            ui.display_text_box.AppendText("IPF converged after " + str(iterations) + " iteration(s).\n")
+        else:
+            ui.display_text_box.AppendText("IPF stopped after " + str(iterations)
+                                           + " iteration(s), margins within " + "%.2e" % conv + ".\n")
+
+        # every seed row keeps its share of its cell
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(seed > 0, tensor / seed, 0).ravel()
+
+        df = self.__seed.copy()
+        df[self.__weight_col] = weights * ratio[cells]
+        return df
+
+    def __get_margin(self, features, aggregate, axes, categories):
+        positions = sorted([axes.index(feature) for feature in features])
+        other_axes = tuple([axis for axis in range(len(axes)) if axis not in positions])
+
+        names = [axes[axis] for axis in positions]
+        if len(names) == 1:
+            index = pd.Index(categories[positions[0]], name=names[0])
+        else:
+            index = pd.MultiIndex.from_product([categories[axis] for axis in positions], names=names)
+            aggregate = aggregate.reorder_levels(names)
+
+        shape = [1] * len(axes)
+        for axis in positions:
+            shape[axis] = len(categories[axis])
+
+        target = aggregate.reindex(index).to_numpy(dtype=float).reshape(shape)
+        return other_axes, target
+
+    def __get_conv(self, tensor, margins):
+        conv = 0.0
+        for other_axes, target in margins:
+            current = tensor.sum(axis=other_axes, keepdims=True)
+            reached = (target > 0) & (current > 0)
+            if reached.any():
+                conv = max(conv, np.abs(current[reached] / target[reached] - 1).max())
+
+        return conv
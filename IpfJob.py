@@ -0,0 +1,399 @@
+from InputSchema import InputSchema
+from IpfEngine import IpfEngine
+from IpfLog import IpfLog
+from PumsRecoder import PumsRecoder
+import pandas as pd
+import numpy as np
+
+
+class IpfJob:
+    PUMS_COLUMNS = InputSchema.get_columns("pums")
+
+    AGE_CAT = {"0-5": "POP_0_5", "5-9": "POP_5_9",
+               "10-14": "POP_10_14", "15-19": "POP_15_19",
+               "20-24": "POP_20_24", "25-34": "POP_25_34",
+               "35-44": "POP_35_44", "45-54": "POP_45_54",
+               "55-59": "POP_55_59", "60-64": "POP_60_64",
+               "65-74": "POP_65_74", "75-84": "POP_75_84",
+               "85+": "POP_85_OVER"}
+    SEX_CAT = {"Male": "POP_M", "Female": "POP_F"}
+    RACE_ETHNICITY = {"Hispanic": "POP_HISP", "OtherNH": "POP_ONH",
+                      "WhiteNH": "POP_WNH", "BlackNH": "POP_BNH"}
+
+    EDU = {"Less than 9th grade": "POP_LESS_9",
+           "9th to 12th grade": "POP_9_12",
+           "High School": "POP_HS",
+           "Some college": "POP_SC",
+           "Associates Degree": "POP_AD",
+           "Bachelors Degree": "POP_BD",
+           "Graduate Degree": "POP_GD"
+           }
+
+    STRATA1 = ["RACE_ETH", "SEX_", "AGE_CAT"]
+    STRATA2 = STRATA1 + ["EDU"]
+    STRATA3 = ["RACE_ETH", "SEX_", "EDU"]
+    STRATA4 = STRATA1 + ["PINCP"]
+    STRATA5 = ["RACE_ETH", "SEX_"]
+    STRATA6 = ["RACE_ETH"]
+
+    AGE_CAT_BELOW25 = ["0-5", "5-9", "10-14", "15-19", "20-24"]
+
+    PUMS_CHUNK_SIZE = 100000
+    MISSING = "N/A"
+
+    IPF_TOLERANCE = IpfEngine.TOLERANCE
+    IPF_MAX_ITERATIONS = IpfEngine.MAX_ITERATIONS
+    IPF_DTYPE = IpfEngine.DTYPE
+
+    # rake race, gender, age and education together in one run instead of two stages
+    IPF_JOINT = False
+    # joint mode fits education over every race, not only White and Black, so it is a different
+    # estimator, but no cell may move further than this from the two-stage result
+    IPF_JOINT_TOLERANCE = 0.05
+
+    def __init__(self, path, state, year, marginal, joint=IPF_JOINT):
+        self.path = path
+        self.state = state
+        self.year = year
+        self.joint = joint
+
+        # the state's row of the year's marginals, so only that row is sent to a worker
+        self.marginal = marginal
+
+        self.__recoder = PumsRecoder(age_cat=IpfJob.AGE_CAT, edu=IpfJob.EDU)
+        self.__ui = IpfLog()
+
+    def run(self):
+        self.read()
+        return self.rake()
+
+    def rake(self):
+        ipf_acs_data, pums_income = self.__start()
+
+        return ipf_acs_data, pums_income, self.__ui.get_text()
+
+    def read(self):
+        self.__ui.display_text_box.AppendText("\nImporting PUMS for "
+                                              + self.state + "...\n")
+
+        # stream the state file, keeping only contingency counts and income weights
+        self.pums_counts = self.__empty_counts(IpfJob.STRATA2)
+        self.pums_income_weights = self.__empty_counts(IpfJob.STRATA6 + ["PINCP"])
+
+        with pd.read_csv(self.path, usecols=IpfJob.PUMS_COLUMNS, chunksize=IpfJob.PUMS_CHUNK_SIZE,
+                         dtype=InputSchema.get_dtypes("pums")) as reader:
+            for chunk in reader:
+                chunk.columns = [col.strip() for col in chunk.columns]
+                chunk = self.__recoder.recode(chunk, year=self.year)
+                chunk[IpfJob.STRATA2] = chunk[IpfJob.STRATA2].fillna(IpfJob.MISSING)
+
+                counts = chunk.groupby(IpfJob.STRATA2).size()
+                self.pums_counts = self.__add_counts(self.pums_counts, counts)
+
+                income = chunk[chunk["AGE_CAT"] != "25-34"]
+                income = self.__remove_rows(df=income)
+
+                # weights summed per distinct income, missing incomes sort last as +inf
+                income = income.assign(PINCP=income["PINCP"].fillna(np.inf))
+                weights = income.groupby(IpfJob.STRATA6 + ["PINCP"])["PWGTP"].sum()
+                self.pums_income_weights = self.__add_counts(self.pums_income_weights, weights)
+
+    def __empty_counts(self, strata):
+        return pd.Series([], index=pd.MultiIndex.from_tuples([], names=strata), dtype="int64")
+
+    def __add_counts(self, total, counts):
+        if total.empty:
+            return counts.astype("int64").sort_index()
+
+        return total.add(counts, fill_value=0).astype("int64").sort_index()
+
+    def __start(self):
+        self.__ui.display_text_box.AppendText("Starting IPF for year :"
+                                              + self.year + "...\n")
+
+        ipf_acs_data = None
+        stratas = [IpfJob.STRATA1, IpfJob.STRATA2, IpfJob.STRATA4]
+
+        for strata in stratas:
+            if strata == IpfJob.STRATA4:
+                pums_income = self.__refine_pums_income()
+            elif self.joint:
+                if strata == IpfJob.STRATA2:
+                    self.__create_joint_seed_matrix()
+                    ipf_acs_data = self.__compute_joint()
+            else:
+                self.__create_seed_matrix(strata=strata)
+                df = self.__compute(strata=strata)
+                if df is not None:
+                    ipf_acs_data = df
+
+        return ipf_acs_data, pums_income
+
+    def __create_seed_matrix(self, strata):
+        counts = self.pums_counts
+        if strata == IpfJob.STRATA1:
+            counts = counts.groupby(level=IpfJob.STRATA1).sum()
+
+        self.seed_matrix = counts.rename("total").reset_index()
+
+        # persons with a missing stratum are left out of the seed
+        missing = (self.seed_matrix[strata] == IpfJob.MISSING).any(axis=1)
+        self.seed_matrix = self.seed_matrix[~missing].reset_index(drop=True)
+
+        if strata == IpfJob.STRATA2:
+            self.seed_matrix = self.__remove_rows(df=self.seed_matrix)
+            # self.seed_matrix = self.seed_matrix.reset_index()
+
+    def __create_joint_seed_matrix(self):
+        self.seed_matrix = self.pums_counts.rename("total").reset_index()
+
+        # education is only raked for 25 and over, younger persons share one N/A category
+        below25 = self.seed_matrix["AGE_CAT"].isin(IpfJob.AGE_CAT_BELOW25)
+        self.seed_matrix.loc[below25, "EDU"] = IpfJob.MISSING
+
+        missing = (self.seed_matrix[IpfJob.STRATA1] == IpfJob.MISSING).any(axis=1)
+        missing |= ~below25 & (self.seed_matrix["EDU"] == IpfJob.MISSING)
+
+        self.seed_matrix = self.seed_matrix[~missing].groupby(IpfJob.STRATA2)["total"].sum().reset_index()
+
+    def __compute(self, strata):
+        mar = self.marginal
+        if strata == IpfJob.STRATA1:
+            self.__ui.display_text_box.AppendText("\nIPF by race, gender and age..\n")
+
+            self.m_sex = self.__sex_marginals(mar)
+            self.m_age_cat = self.__age_marginals(mar)
+            self.m_race = self.__race_marginals(mar)
+
+            aggregates = [self.m_race, self.m_sex, self.m_age_cat]
+            dimension = [["RACE_ETH"], ["SEX_"], ["AGE_CAT"]]
+
+            ipf = IpfEngine(self.seed_matrix, aggregates, dimension, tolerance=IpfJob.IPF_TOLERANCE,
+                            max_iterations=IpfJob.IPF_MAX_ITERATIONS, dtype=IpfJob.IPF_DTYPE)
+            df = ipf.iteration(self.__ui)
+
+            df = self.__remove_rows(df)
+
+            self.m_age_cat = df.groupby("AGE_CAT")["total"].sum()
+            self.m_sex = df.groupby("SEX_")["total"].sum()
+            self.m_race = df.groupby("RACE_ETH")["total"].sum()
+
+        elif strata == IpfJob.STRATA2:
+            self.__ui.display_text_box.AppendText("\nIPF by race, gender, age and education..\n")
+            self.m_edu = self.__edu_marginals(mar)
+
+            aggregates = [self.m_race, self.m_sex, self.m_age_cat, self.m_edu]
+            dimension = [["RACE_ETH"], ["SEX_"], ["AGE_CAT"], ["EDU"]]
+
+            ipf = IpfEngine(self.seed_matrix, aggregates, dimension, tolerance=IpfJob.IPF_TOLERANCE,
+                            max_iterations=IpfJob.IPF_MAX_ITERATIONS, dtype=IpfJob.IPF_DTYPE)
+            df = ipf.iteration(self.__ui)
+
+            return self.__get_education_table(df=df)
+
+    def __compute_joint(self):
+        mar = self.marginal
+        self.__ui.display_text_box.AppendText("\nIPF by race, gender, age and education at once..\n")
+
+        self.m_sex = self.__sex_marginals(mar)
+        self.m_age_cat = self.__age_marginals(mar)
+        self.m_race = self.__race_marginals(mar)
+
+        self.m_edu = self.__edu_marginals(mar)
+        below25 = self.m_age_cat.index.isin(IpfJob.AGE_CAT_BELOW25)
+        self.m_edu[IpfJob.MISSING] = self.m_age_cat[below25].sum()
+
+        aggregates = [self.m_race, self.m_sex, self.m_age_cat, self.m_edu]
+        dimension = [["RACE_ETH"], ["SEX_"], ["AGE_CAT"], ["EDU"]]
+
+        ipf = IpfEngine(self.seed_matrix, aggregates, dimension, tolerance=IpfJob.IPF_TOLERANCE,
+                        max_iterations=IpfJob.IPF_MAX_ITERATIONS, dtype=IpfJob.IPF_DTYPE)
+        df = ipf.iteration(self.__ui)
+
+        df = self.__remove_rows(df)
+
+        return self.__get_education_table(df=df)
+
+    def __get_education_table(self, df):
+        mar = self.marginal
+        df_education = self.__merge_education(df=df)
+
+        # df_some_college = self.__remove_education(df=df)
+
+        df_education = self.__add_column(df=df_education, col_name="FIPS", value=int(mar["ID2"]), index=0)
+        df_education = self.__add_column(df=df_education, col_name="YEAR", value="20" + self.year, index=1)
+
+        df_education = self.__fill_dataframe(df=df_education, year=self.year, fips=int(mar["ID2"]))
+
+        return df_education
+
+    def __refine_pums_income(self):
+        fips = int(self.marginal["ID2"])
+
+        # df_income = self.pums_income_weights.groupby(level=IpfJob.STRATA5)
+        df_income = self.pums_income_weights.groupby(level=IpfJob.STRATA6[0])
+
+        median_income_list = []
+        mean_income_list = []
+        race_list = []
+        # gender_list = []
+
+        for key, weights in df_income:
+            # race_list.append(key[0])
+            # gender_list.append(key[1])
+
+            race_list.append(key)
+
+            income = weights.index.get_level_values("PINCP").to_numpy(dtype=float)
+            weights = weights.to_numpy(dtype=float)
+            reported = np.isfinite(income)
+
+            cum_sum_weights = weights.cumsum()
+            cut_off_weight = weights.sum() / 2.0
+
+            weighted_median_income = income[cum_sum_weights >= cut_off_weight][0]
+            if not np.isfinite(weighted_median_income):
+                weighted_median_income = np.nan
+            weighted_income = (weights[reported] * income[reported]).sum() / weights.sum()
+
+            median_income_list.append(weighted_median_income)
+            mean_income_list.append(weighted_income)
+
+        # df_income = pd.DataFrame(columns=["FIPS", "YEAR", "RACE_ETH", "SEX_", "Median", "Mean"])
+        df_income = pd.DataFrame(columns=["FIPS", "YEAR", "RACE_ETH", "Median", "Mean"])
+
+        df_income["RACE_ETH"] = race_list
+        # df_income["SEX_"] = gender_list
+
+        df_income["Median"] = median_income_list
+        df_income["Mean"] = mean_income_list
+
+        df_income["FIPS"] = int(fips)
+        df_income["YEAR"] = "20" + self.year
+
+        return df_income
+
+    def __remove_rows(self, df):
+        df = df[(df["RACE_ETH"] == "WhiteNH") | (df["RACE_ETH"] == "BlackNH")]
+        for age_cat in IpfJob.AGE_CAT_BELOW25:
+            df = df[df["AGE_CAT"] != age_cat]
+
+        return df
+
+    def __merge_education(self, df):
+        replace_rules = {}
+        edu_cat = "HS or Less"
+        for edu, var in IpfJob.EDU.items():
+            replace_rules[edu] = edu_cat
+            if edu == "High School":
+                replace_rules[edu] = edu_cat
+                edu_cat = "Some college or more"
+
+        df = df[df["AGE_CAT"] != "25-34"]
+
+        df = df.groupby(IpfJob.STRATA3, as_index=False)["total"].sum()
+        return self.__merge_rows(df=df, replace_rules=replace_rules,
+                                 strata=IpfJob.STRATA3, col="EDU")
+
+    def __remove_education(self, df):
+        return df[df["EDU"] == "Some college or more"]
+
+    def __merge_rows(self, df, replace_rules, strata, col):
+        df[col] = df[col].replace(replace_rules)
+        df = df.groupby(strata, as_index=False)["total"].sum()
+        return df
+
+    def __add_column(self, df, col_name, value, index):
+        df.insert(index, col_name, value)
+        return df
+
+    def __fill_dataframe(self, df, year, fips):
+        cols = df.columns
+        year = "20" + year
+
+        new_df = pd.DataFrame(columns=cols)
+
+        for col in cols:
+            if col == "RACE_ETH":
+                new_df["RACE_ETH"] = ["BlackNH",
+                                      "BlackNH",
+                                      "BlackNH",
+                                      "BlackNH",
+                                      "WhiteNH",
+                                      "WhiteNH",
+                                      "WhiteNH",
+                                      "WhiteNH"]
+            elif col == "SEX_":
+                new_df["SEX_"] = ["Male",
+                                  "Male",
+                                  "Female",
+                                  "Female",
+                                  "Male",
+                                  "Male",
+                                  "Female",
+                                  "Female"]
+            elif col == "EDU":
+                new_df["EDU"] = ["HS or Less",
+                                 "Some college or more",
+                                 "HS or Less",
+                                 "Some college or more",
+                                 "HS or Less",
+                                 "Some college or more",
+                                 "HS or Less",
+                                 "Some college or more"]
+            elif col == "total":
+                del new_df["total"]
+
+        new_df["FIPS"] = fips
+        new_df["YEAR"] = year
+
+        # print(new_df.columns)
+
+        df = pd.merge(new_df, df, on=list(new_df.columns), how="left")
+        df["total"] = df["total"].fillna(0)
+
+        return df
+
+    def __race_marginals(self, mar):
+        return self.__get_marginal_by_attribute(marginal=mar,
+                                                col_name="RACE_ETH",
+                                                col_dict=IpfJob.RACE_ETHNICITY)
+
+    def __sex_marginals(self, mar):
+        return self.__get_marginal_by_attribute(marginal=mar,
+                                                col_name="SEX_",
+                                                col_dict=IpfJob.SEX_CAT)
+
+    def __age_marginals(self, mar):
+        return self.__get_marginal_by_attribute(marginal=mar,
+                                                col_name="AGE_CAT",
+                                                col_dict=IpfJob.AGE_CAT)
+
+    def __edu_marginals(self, mar):
+        m_edu = self.__get_marginal_by_attribute(marginal=mar,
+                                                 col_name="EDU",
+                                                 col_dict=IpfJob.EDU)
+        total_pop = self.__get_pop_25_over()
+        total_percent = m_edu.sum()
+
+        for edu, est in m_edu.items():
+            m_edu[edu] = float(total_pop * est/total_percent)
+
+        return m_edu
+
+    def __get_marginal_by_attribute(self, marginal, col_name, col_dict):
+        # categories present in the state's PUMS, valued with the ACS marginals
+        categories = self.pums_counts.index.get_level_values(col_name).unique()
+        categories = categories[categories != IpfJob.MISSING].sort_values()
+
+        mar_by_attr = pd.Series([float(marginal[col_dict[attr]]) for attr in categories],
+                                index=pd.Index(categories, name=col_name), name="total")
+        return mar_by_attr
+
+    def __get_pop_25_over(self):
+        pop = 0
+        for age_cat, est in self.m_age_cat.items():
+            if age_cat not in IpfJob.AGE_CAT_BELOW25:
+                pop += est
+
+        return pop
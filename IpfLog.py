@@ -0,0 +1,11 @@
+class IpfLog:
+    # stands in for the interface inside worker processes, the text is shown once the job is back
+    def __init__(self):
+        self.display_text_box = self
+        self.__lines = []
+
+    def AppendText(self, text):
+        self.__lines.append(text)
+
+    def get_text(self):
+        return "".join(self.__lines)
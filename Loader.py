@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
+import wx
+
+
+class Loader:
+    # one worker keeps imports in selection order, so they never race on a model's state
+    WORKERS = 1
+
+    def __init__(self, interface, workers=WORKERS):
+        self.__ui = interface
+        self.__executor = ThreadPoolExecutor(max_workers=workers)
+        self.__pending = set()
+        self.__lock = threading.Lock()
+
+    def submit(self, name, function, *args):
+        self.__ui.display_text_box.AppendText("Loading " + name + " in the background...\n")
+
+        future = self.__executor.submit(function, *args)
+        with self.__lock:
+            self.__pending.add(future)
+
+        future.add_done_callback(lambda done: wx.CallAfter(self.__complete, name, done))
+        return future
+
+    def is_busy(self):
+        with self.__lock:
+            return len(self.__pending) > 0
+
+    def wait(self):
+        with self.__lock:
+            pending = list(self.__pending)
+
+        wait(pending)
+
+    def shutdown(self, wait=True):
+        self.__executor.shutdown(wait=wait, cancel_futures=True)
+
+    def __complete(self, name, future):
+        with self.__lock:
+            self.__pending.discard(future)
+
+        if future.cancelled():
+            return
+
+        error = future.exception()
+        if error is not None:
+            self.__ui.display_text_box.AppendText("Loading " + name + " failed!\n")
+            wx.MessageBox("Error: Cannot load " + name + "!\n" + str(error))
+        else:
+            self.__ui.display_text_box.AppendText("Loading " + name + " finished!\n")
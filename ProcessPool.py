@@ -0,0 +1,14 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+
+
+class ProcessPool:
+    # pools are started from threads of the running wx process, a forked child would inherit
+    # locks held by the other threads, so every worker is a freshly spawned interpreter
+    CONTEXT = multiprocessing.get_context("spawn")
+    CPU_COUNT = os.cpu_count() or 1
+
+    @staticmethod
+    def create(max_workers=None):
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=ProcessPool.CONTEXT)
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class PumsRecoder:
+    # SCHL upper bounds of each education category, before and after the 2008 recoding of SCHL
+    SCHL_BOUNDS = {"pre2008": [4, 8, 9, 11, 12, 13, 16],
+                   "post2008": [11, 15, 17, 19, 20, 21, 24]}
+    FIRST_SCHL_YEAR = 8
+
+    # non-Hispanic (HISP == 1) persons by RAC1P, other HISP codes are Hispanic
+    NOT_HISPANIC = 1
+    RACE_NH = {1: "WhiteNH", 2: "BlackNH"}
+    OTHER_NH = "OtherNH"
+    HISPANIC = "Hispanic"
+
+    SEX = {1: "Male", 2: "Female"}
+
+    def __init__(self, age_cat, edu):
+        # AGE_CAT keys name their lower bound first ("25-34", "85+"), the last one is open ended
+        self.__age_labels = np.array(list(age_cat), dtype=object)
+        self.__age_lower = np.array([int(label.split("-")[0].rstrip("+")) for label in age_cat])
+        self.__edu_labels = np.array(list(edu) + [None], dtype=object)
+
+    def recode(self, data, year):
+        data["AGE_CAT"] = self.age_cat(data["AGEP"])
+        data["RACE_ETH"] = self.race_ethnicity(data["HISP"], data["RAC1P"])
+        data["SEX_"] = self.sex(data["SEX"])
+        data["EDU"] = self.education(data["SCHL"], year)
+
+        return data
+
+    def age_cat(self, age):
+        age = age.to_numpy(dtype=float)
+        codes = np.searchsorted(self.__age_lower, age, side="right") - 1
+
+        # the bins are integer ranges, anything they don't cover falls through to the last category
+        codes[(codes < 0) | np.isnan(age) | (age != np.floor(age))] = len(self.__age_labels) - 1
+        return self.__age_labels[codes]
+
+    def race_ethnicity(self, hisp, rac1p):
+        hisp = hisp.to_numpy(dtype=float)
+        rac1p = rac1p.to_numpy(dtype=float)
+
+        labels = np.full(len(hisp), PumsRecoder.HISPANIC, dtype=object)
+        not_hispanic = hisp == PumsRecoder.NOT_HISPANIC
+        labels[not_hispanic] = PumsRecoder.OTHER_NH
+        for code, label in PumsRecoder.RACE_NH.items():
+            labels[not_hispanic & (rac1p == code)] = label
+
+        return labels
+
+    def sex(self, sex):
+        sex = sex.to_numpy(dtype=float)
+
+        labels = np.full(len(sex), None, dtype=object)
+        for code, label in PumsRecoder.SEX.items():
+            labels[sex == code] = label
+
+        return labels
+
+    def education(self, schl, year):
+        bounds = PumsRecoder.SCHL_BOUNDS["post2008" if int(year) >= PumsRecoder.FIRST_SCHL_YEAR else "pre2008"]
+        schl = schl.to_numpy(dtype=float)
+
+        # first category whose upper bound is >= SCHL, missing or above the last bound is None
+        codes = np.searchsorted(bounds, schl, side="left")
+        codes[np.isnan(schl)] = len(bounds)
+        return self.__edu_labels[codes]
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+
+class ReplicateStats:
+    QUANTILES = [0.025, 0.5, 0.975]
+    MARKERS = 5
+
+    def __init__(self, columns, quantiles=QUANTILES):
+        self.__columns = list(columns)
+        self.__quantiles = np.asarray(quantiles, dtype=float)
+        self.__index = None
+
+        # Welford running mean / sum of squared deviations, one cell per stratum and column
+        self.__count = np.zeros((0, len(self.__columns)))
+        self.__mean = np.zeros((0, len(self.__columns)))
+        self.__m2 = np.zeros((0, len(self.__columns)))
+
+        # P-square markers, one sketch per stratum, column and quantile
+        shape = (0, len(self.__columns), len(self.__quantiles), ReplicateStats.MARKERS)
+        self.__heights = np.zeros(shape)
+        self.__positions = np.zeros(shape)
+        self.__desired = np.zeros(shape)
+
+    def add(self, replicate):
+        rows = self.__get_rows(replicate.index)
+
+        values = np.full((len(self.__index), len(self.__columns)), np.nan)
+        values[rows] = replicate[self.__columns].to_numpy(dtype=float)
+        observed = ~np.isnan(values)
+
+        self.__count[observed] += 1
+        delta = np.where(observed, values - self.__mean, 0)
+        self.__mean[observed] += delta[observed] / self.__count[observed]
+        self.__m2[observed] += (delta * (values - self.__mean))[observed]
+
+        self.__update_sketch(values, observed)
+
+    def get_frame(self):
+        if self.__index is None:
+            return pd.DataFrame()
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            variance = np.where(self.__count > 1, self.__m2 / (self.__count - 1), np.nan)
+        quantiles = self.__get_quantiles()
+
+        columns = {"Replicates": self.__count.max(axis=1).astype(int)}
+        for idx, col in enumerate(self.__columns):
+            columns[col + "_Mean"] = np.where(self.__count[:, idx] > 0, self.__mean[:, idx], np.nan)
+            columns[col + "_Var"] = variance[:, idx]
+            for q_idx, q in enumerate(self.__quantiles):
+                columns[col + "_P" + ("%g" % (100 * q))] = quantiles[:, idx, q_idx]
+
+        return pd.DataFrame(columns, index=self.__index)
+
+    def __get_rows(self, index):
+        if self.__index is None:
+            self.__index = index
+        else:
+            new_index = index.difference(self.__index)
+            if len(new_index) > 0:
+                self.__index = self.__index.append(new_index)
+
+        extra = len(self.__index) - len(self.__count)
+        if extra > 0:
+            self.__count = self.__grow(self.__count, extra)
+            self.__mean = self.__grow(self.__mean, extra)
+            self.__m2 = self.__grow(self.__m2, extra)
+            self.__heights = self.__grow(self.__heights, extra)
+            self.__positions = self.__grow(self.__positions, extra)
+            self.__desired = self.__grow(self.__desired, extra)
+
+        return self.__index.get_indexer(index)
+
+    def __grow(self, values, extra):
+        return np.concatenate([values, np.zeros((extra,) + values.shape[1:])])
+
+    def __update_sketch(self, values, observed):
+        p = self.__quantiles[np.newaxis, np.newaxis, :]
+        x = np.broadcast_to(values[:, :, np.newaxis], self.__heights.shape[:3])
+        count = np.broadcast_to(self.__count[:, :, np.newaxis], self.__heights.shape[:3])
+        observed = np.broadcast_to(observed[:, :, np.newaxis], self.__heights.shape[:3])
+
+        # the first observations are kept as is and sorted once the sketch is full
+        filling = observed & (count <= ReplicateStats.MARKERS)
+        cells = np.nonzero(filling)
+        self.__heights[cells + ((count[cells] - 1).astype(int),)] = x[cells]
+
+        ready = filling & (count == ReplicateStats.MARKERS)
+        if np.any(ready):
+            cells = np.nonzero(ready)
+            self.__heights[cells] = np.sort(self.__heights[cells], axis=-1)
+            self.__positions[cells] = np.arange(1, ReplicateStats.MARKERS + 1)
+            p_cells = np.broadcast_to(p, ready.shape)[cells][:, np.newaxis]
+            self.__desired[cells] = np.hstack([np.ones_like(p_cells), 1 + 2 * p_cells, 1 + 4 * p_cells,
+                                               3 + 2 * p_cells, 5 * np.ones_like(p_cells)])
+
+        updating = observed & (count > ReplicateStats.MARKERS)
+        if np.any(updating):
+            cells = np.nonzero(updating)
+            p_cells = np.broadcast_to(p, updating.shape)[cells]
+            heights, positions, desired = self.__p_square(self.__heights[cells], self.__positions[cells],
+                                                          self.__desired[cells], x[cells], p_cells)
+            self.__heights[cells] = heights
+            self.__positions[cells] = positions
+            self.__desired[cells] = desired
+
+    def __p_square(self, q, n, desired, x, p):
+        rows = np.arange(len(x))
+
+        # cell k with q[k] <= x < q[k + 1], extending the outer markers when x falls outside
+        q[:, 0] = np.minimum(q[:, 0], x)
+        q[:, 4] = np.maximum(q[:, 4], x)
+        k = np.clip(np.sum(q[:, 1:4] <= x[:, np.newaxis], axis=1), 0, 3)
+
+        n += np.arange(ReplicateStats.MARKERS)[np.newaxis, :] > k[:, np.newaxis]
+        desired += np.stack([np.zeros_like(p), p / 2, p, (1 + p) / 2, np.ones_like(p)], axis=1)
+
+        for i in range(1, 4):
+            d = desired[:, i] - n[:, i]
+            move = ((d >= 1) & (n[:, i + 1] - n[:, i] > 1)) | ((d <= -1) & (n[:, i - 1] - n[:, i] < -1))
+            d = np.sign(d) * move
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                parabolic = q[:, i] + d / (n[:, i + 1] - n[:, i - 1]) * (
+                    (n[:, i] - n[:, i - 1] + d) * (q[:, i + 1] - q[:, i]) / (n[:, i + 1] - n[:, i])
+                    + (n[:, i + 1] - n[:, i] - d) * (q[:, i] - q[:, i - 1]) / (n[:, i] - n[:, i - 1]))
+
+                neighbour = (i + d).astype(int)
+                linear = q[:, i] + d * (q[rows, neighbour] - q[:, i]) / (n[rows, neighbour] - n[:, i])
+
+            inside = (q[:, i - 1] < parabolic) & (parabolic < q[:, i + 1])
+            q[:, i] = np.where(move, np.where(inside, parabolic, linear), q[:, i])
+            n[:, i] += d
+
+        return q, n, desired
+
+    def __get_quantiles(self):
+        count = np.broadcast_to(self.__count[:, :, np.newaxis], self.__heights.shape[:3])
+
+        # read the target rank off the markers, which beats the middle marker alone while
+        # the markers are still catching up with their desired positions
+        target = 1 + (count - 1) * self.__quantiles[np.newaxis, np.newaxis, :]
+        segment = np.clip(np.sum(self.__positions <= target[..., np.newaxis], axis=-1) - 1, 0, 3)
+        lower = np.take_along_axis(self.__positions, segment[..., np.newaxis], axis=-1)[..., 0]
+        upper = np.take_along_axis(self.__positions, segment[..., np.newaxis] + 1, axis=-1)[..., 0]
+        q_lower = np.take_along_axis(self.__heights, segment[..., np.newaxis], axis=-1)[..., 0]
+        q_upper = np.take_along_axis(self.__heights, segment[..., np.newaxis] + 1, axis=-1)[..., 0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            quantiles = q_lower + (target - lower) / (upper - lower) * (q_upper - q_lower)
+
+        # too few replicates for the sketch, interpolate the stored observations instead
+        for size in range(ReplicateStats.MARKERS + 1):
+            cells = np.nonzero(count == size)
+            if size == 0:
+                quantiles[cells] = np.nan
+                continue
+
+            observations = np.sort(self.__heights[cells][:, :size], axis=-1)
+            rank = self.__quantiles[cells[2]] * (size - 1)
+            lower = np.floor(rank).astype(int)
+            upper = np.minimum(lower + 1, size - 1)
+            rows = np.arange(len(rank))
+            quantiles[cells] = observations[rows, lower] + (rank - lower) * (
+                observations[rows, upper] - observations[rows, lower])
+
+        return quantiles
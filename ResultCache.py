@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import pickle
+
+
+class ResultCache:
+    CACHE_DIR = ".post_processor_cache"
+    MAX_BYTES = 64 * 1024 * 1024
+    BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_dir, max_bytes=MAX_BYTES):
+        self.__cache_dir = cache_dir
+        self.__max_bytes = max_bytes
+
+    def hash_files(self, file_paths):
+        digest = hashlib.sha256()
+        for path in file_paths:
+            with open(path, "rb") as file:
+                for block in iter(lambda: file.read(ResultCache.BLOCK_SIZE), b""):
+                    digest.update(block)
+            digest.update(b"\0")
+
+        return digest.hexdigest()
+
+    def get_key(self, content_digest, params):
+        content = content_digest + json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def load(self, key):
+        path = self.__get_path(key)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            with open(path, "rb") as file:
+                value = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+        # mark as recently used for eviction
+        os.utime(path)
+        return value
+
+    def store(self, key, value):
+        os.makedirs(self.__cache_dir, exist_ok=True)
+
+        path = self.__get_path(key)
+        with open(path + ".tmp", "wb") as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+        self.__evict()
+
+    def invalidate(self):
+        for path in self.__get_entries():
+            os.remove(path)
+
+    def __evict(self):
+        entries = sorted(self.__get_entries(), key=os.path.getmtime)
+        total = sum([os.path.getsize(path) for path in entries])
+
+        while total > self.__max_bytes and len(entries) > 0:
+            oldest = entries.pop(0)
+            total -= os.path.getsize(oldest)
+            os.remove(oldest)
+
+    def __get_entries(self):
+        if not os.path.isdir(self.__cache_dir):
+            return []
+
+        return [os.path.join(self.__cache_dir, name) for name in os.listdir(self.__cache_dir)
+                if name.endswith(".pkl")]
+
+    def __get_path(self, key):
+        return os.path.join(self.__cache_dir, key + ".pkl")
@@ -0,0 +1,40 @@
+import pandas as pd
+
+
+class ResultStore:
+    def __init__(self):
+        # results sorted by their index, so .loc lookups and slices are binary searches
+        self.__tables = {}
+
+    def put(self, kind, data, by_state=False):
+        self.__tables[(kind, by_state)] = data.sort_index()
+
+    def get(self, kind, by_state=False):
+        return self.__tables.get((kind, by_state), pd.DataFrame())
+
+    def query(self, kind, by_state=False, **keys):
+        data = self.get(kind, by_state=by_state)
+        if data.empty:
+            return data
+
+        unknown = set(keys) - set(data.index.names)
+        if len(unknown) > 0:
+            raise KeyError("unknown index level(s) " + ", ".join(sorted(unknown)))
+
+        # a value is an exact key, a (start, stop) tuple an inclusive range and a list a set of keys
+        indexer = []
+        for name in data.index.names:
+            key = keys.get(name)
+            if key is None:
+                indexer.append(slice(None))
+            elif isinstance(key, tuple):
+                indexer.append(slice(key[0], key[1]))
+            elif isinstance(key, list):
+                indexer.append(key)
+            else:
+                indexer.append(slice(key, key))
+
+        if data.index.nlevels == 1:
+            return data.loc[indexer[0], :]
+
+        return data.loc[tuple(indexer), :]
@@ -0,0 +1,103 @@
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from ProcessPool import ProcessPool
+import hashlib
+import json
+import os
+
+
+class RocExport:
+    FORMATS = ["png", "svg"]
+    CACHE_FILENAME = "roc_cache.json"
+    MAX_LABELS = 30
+
+    def __init__(self, out_dir, formats=FORMATS, workers=None):
+        self.__out_dir = out_dir
+        self.__formats = list(formats)
+        self.__workers = workers
+
+    def export(self, figures):
+        cache = self.__read_cache()
+
+        names = []
+        titles = []
+        points = []
+        for name, (title, sens_spec) in figures.items():
+            scores, fpr, tpr = self.__get_points(sens_spec)
+            digest = self.__get_digest(title, scores, fpr, tpr)
+
+            if cache.get(name) == digest and self.__is_exported(name):
+                continue
+
+            cache[name] = digest
+            names.append(name)
+            titles.append(title)
+            points.append((scores, fpr, tpr))
+
+        if len(names) > 0:
+            with ProcessPool.create(max_workers=self.__workers) as executor:
+                list(executor.map(self.render, names, titles, points))
+
+            self.__write_cache(cache)
+
+        return names
+
+    def render(self, name, title, points):
+        scores, fpr, tpr = points
+
+        figure = Figure(figsize=(6, 6))
+        FigureCanvasAgg(figure)
+        axes = figure.add_subplot()
+
+        axes.plot(fpr, tpr, color="orange", marker="o", markersize=3, label="ROC")
+        axes.plot([0, 1], [0, 1], color="darkblue", linestyle="--")
+
+        step = max(1, -(-len(scores) // RocExport.MAX_LABELS))
+        for score, i, j in list(zip(scores, fpr, tpr))[::step]:
+            axes.annotate(score, xy=(i, j))
+
+        axes.set_xlabel("1-Specificity")
+        axes.set_ylabel("Sensitivity")
+        axes.set_title(title)
+        axes.legend()
+
+        for fmt in self.__formats:
+            figure.savefig(self.__get_path(name, fmt), format=fmt)
+
+    def __get_points(self, sens_spec):
+        scores = []
+        fpr = []
+        tpr = []
+        for score, data in sens_spec.items():
+            scores.append(score)
+            fpr.append(1 - data["Specificity"])
+            tpr.append(data["Sensitivity"])
+
+        return scores, fpr, tpr
+
+    def __get_digest(self, title, scores, fpr, tpr):
+        content = json.dumps([title, self.__formats, scores, fpr, tpr])
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def __is_exported(self, name):
+        for fmt in self.__formats:
+            if not os.path.isfile(self.__get_path(name, fmt)):
+                return False
+
+        return True
+
+    def __get_path(self, name, fmt):
+        return os.path.join(self.__out_dir, name + "." + fmt)
+
+    def __read_cache(self):
+        cache_path = os.path.join(self.__out_dir, RocExport.CACHE_FILENAME)
+        if not os.path.isfile(cache_path):
+            return {}
+
+        with open(cache_path, "r") as file:
+            return json.load(file)
+
+    def __write_cache(self, cache):
+        cache_path = os.path.join(self.__out_dir, RocExport.CACHE_FILENAME)
+        with open(cache_path, "w") as file:
+            json.dump(cache, file, indent=1)
@@ -0,0 +1,274 @@
+from itertools import repeat
+from ProcessPool import ProcessPool
+import numpy as np
+import pandas as pd
+
+
+class ScreeningEngine:
+    OUTCOMES = ["True Positive", "False Positive", "True Negative", "False Negative"]
+
+    POSITIVE = 1
+    NEGATIVE = 0
+
+    REPLICATE_BATCH = 50
+
+    def __init__(self, cut_off_scores, score_col="depscalescore", weight_col="wtmec2yr"):
+        self.__cut_off_scores = list(cut_off_scores)
+        self.__score_col = score_col
+        self.__weight_col = weight_col
+
+    def screen(self, data, strata, gold_stds):
+        keys, rows, cells, weights, shape = self.__prepare(data, strata, gold_stds)
+
+        size = np.prod(shape)
+        weight_tensor = np.bincount(cells, weights=weights[rows], minlength=size).reshape(shape)
+        freq_tensor = np.bincount(cells, minlength=size).reshape(shape)
+
+        sens, spec = self.__get_sens_spec(weight_tensor, freq_tensor)
+
+        sens_spec = {}
+        for gold_idx, gold_std in enumerate(gold_stds):
+            sens_spec[gold_std] = {}
+            for idx, key in enumerate(keys):
+                sens_spec[gold_std][key] = self.__to_dict({"Sensitivity": sens[gold_idx, idx],
+                                                           "Specificity": spec[gold_idx, idx]},
+                                                          self.__cut_off_scores)
+
+        return sens_spec
+
+    def bootstrap(self, data, strata, gold_stds, resample_by, replicates,
+                  seed=None, workers=None, confidence=0.95):
+        keys, rows, cells, weights, shape = self.__prepare(data, strata, gold_stds)
+        groups = pd.factorize(data[resample_by])[0]
+
+        size = np.prod(shape)
+        weight_tensor = np.bincount(cells, weights=weights[rows], minlength=size).reshape(shape)
+        freq_tensor = np.bincount(cells, minlength=size).reshape(shape)
+
+        sens, spec = self.__get_sens_spec(weight_tensor, freq_tensor)
+
+        # fixed batches with spawned seeds keep the draws independent of the worker count
+        num_batches = -(-replicates // ScreeningEngine.REPLICATE_BATCH)
+        batch_sizes = [min(ScreeningEngine.REPLICATE_BATCH, replicates - batch * ScreeningEngine.REPLICATE_BATCH)
+                       for batch in range(num_batches)]
+        seeds = np.random.SeedSequence(seed).spawn(num_batches)
+
+        with ProcessPool.create(max_workers=workers) as executor:
+            batches = list(executor.map(self.get_replicates, seeds, batch_sizes, repeat(groups),
+                                        repeat(rows), repeat(cells), repeat(weights), repeat(shape)))
+
+        sens_replicates = np.concatenate([batch[0] for batch in batches])
+        spec_replicates = np.concatenate([batch[1] for batch in batches])
+
+        alpha = 100 * (1 - confidence) / 2
+        sens_lower, sens_upper = np.percentile(sens_replicates, [alpha, 100 - alpha], axis=0)
+        spec_lower, spec_upper = np.percentile(spec_replicates, [alpha, 100 - alpha], axis=0)
+
+        sens_spec = {}
+        for gold_idx, gold_std in enumerate(gold_stds):
+            sens_spec[gold_std] = {}
+            for idx, key in enumerate(keys):
+                cell = (gold_idx, idx)
+                sens_spec[gold_std][key] = self.__to_dict({"Sensitivity": sens[cell],
+                                                           "Specificity": spec[cell],
+                                                           "Sensitivity_Lower": sens_lower[cell],
+                                                           "Sensitivity_Upper": sens_upper[cell],
+                                                           "Specificity_Lower": spec_lower[cell],
+                                                           "Specificity_Upper": spec_upper[cell]},
+                                                          self.__cut_off_scores)
+
+        return sens_spec
+
+    def get_replicates(self, seed, num_replicates, groups, rows, cells, weights, shape):
+        rng = np.random.default_rng(seed)
+
+        # every slot of a group draws one of that group's members, so each group keeps its own size
+        group_order = np.argsort(groups, kind="stable")
+        group_starts = np.flatnonzero(np.append(True, np.diff(groups[group_order]) != 0))
+        group_sizes = np.diff(np.append(group_starts, len(groups)))
+        slot_starts = np.repeat(group_starts, group_sizes)
+        slot_sizes = np.repeat(group_sizes, group_sizes)
+
+        size = np.prod(shape)
+        weight_tensor = np.zeros((num_replicates, size))
+        freq_tensor = np.zeros((num_replicates, size))
+        row_weights = weights[rows]
+
+        for replicate in range(num_replicates):
+            draws = group_order[slot_starts + rng.integers(0, slot_sizes)]
+            counts = np.bincount(draws, minlength=len(groups))[rows]
+
+            weight_tensor[replicate] = np.bincount(cells, weights=counts * row_weights, minlength=size)
+            freq_tensor[replicate] = np.bincount(cells, weights=counts, minlength=size)
+
+        return self.__get_sens_spec(weight_tensor.reshape((num_replicates,) + shape),
+                                    freq_tensor.reshape((num_replicates,) + shape))
+
+    def roc(self, data, strata, gold_stds):
+        keys, codes = self.__get_strata_codes(data, strata)
+        scores, weights = self.__get_arrays(data)
+        golds = [data[gold_std].to_numpy(dtype=float) for gold_std in gold_stds]
+
+        rows = np.tile(np.arange(len(scores)), len(codes))
+        codes = np.concatenate(codes)
+
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(keys) + 1))
+
+        sens_spec = {}
+        for gold_std in gold_stds:
+            sens_spec[gold_std] = {}
+
+        for idx, key in enumerate(keys):
+            stratum = rows[order[bounds[idx]:bounds[idx + 1]]]
+
+            # sort the stratum once and reuse the order for every gold standard
+            scored = stratum[~np.isnan(scores[stratum])]
+            scored = scored[np.argsort(-scores[scored], kind="stable")]
+
+            for gold_std, gold in zip(gold_stds, golds):
+                sens_spec[gold_std][key] = self.__roc(scores, gold, weights, stratum, scored)
+
+        return sens_spec
+
+    def __roc(self, scores, gold, weights, stratum, scored):
+        is_positive = gold[stratum] == ScreeningEngine.POSITIVE
+        is_negative = gold[stratum] == ScreeningEngine.NEGATIVE
+
+        scored = scored[(gold[scored] == ScreeningEngine.POSITIVE) | (gold[scored] == ScreeningEngine.NEGATIVE)]
+        if len(scored) == 0:
+            return {}
+
+        sorted_scores = scores[scored]
+        sorted_positive = gold[scored] == ScreeningEngine.POSITIVE
+        sorted_weights = weights[scored]
+
+        # every row at or above a distinct score screens positive at that threshold
+        last = np.flatnonzero(np.append(sorted_scores[1:] != sorted_scores[:-1], True))
+        thresholds = sorted_scores[last][::-1]
+
+        positive = self.__cumulate_screens(sorted_positive, sorted_weights, last,
+                                           total_weight=weights[stratum][is_positive].sum(),
+                                           total_freq=is_positive.sum())
+        negative = self.__cumulate_screens(~sorted_positive, sorted_weights, last,
+                                           total_weight=weights[stratum][is_negative].sum(),
+                                           total_freq=is_negative.sum())
+
+        outcomes = {"True Positive": positive["Screened"],
+                    "False Positive": negative["Screened"],
+                    "True Negative": negative["Not Screened"],
+                    "False Negative": positive["Not Screened"]}
+
+        if np.all(thresholds == np.round(thresholds)):
+            thresholds = thresholds.astype(int)
+
+        sens, spec = self.__get_outcome_ratios(outcomes)
+        return self.__to_dict({"Sensitivity": sens, "Specificity": spec}, thresholds.tolist())
+
+    def __prepare(self, data, strata, gold_stds):
+        keys, codes = self.__get_strata_codes(data, strata)
+        scores, weights = self.__get_arrays(data)
+
+        # a row screens positive at every cut-off up to its bin, missing scores never do
+        bins = np.searchsorted(np.asarray(self.__cut_off_scores, dtype=float), scores, side="right")
+        bins[np.isnan(scores)] = 0
+
+        # one entry per (row, stratification, definition), flattened to a
+        # [definition, stratum, bin, gold standard] cell
+        shape = (len(gold_stds), len(keys), len(self.__cut_off_scores) + 1, 2)
+        rows = np.tile(np.arange(len(scores)), len(codes))
+        codes = np.concatenate(codes)
+        stratum_bins = codes * shape[2] + bins[rows]
+
+        valid_rows = []
+        valid_cells = []
+        for gold_idx, gold_std in enumerate(gold_stds):
+            gold = data[gold_std].to_numpy(dtype=float)[rows]
+            is_positive = gold == ScreeningEngine.POSITIVE
+            valid = (codes >= 0) & (is_positive | (gold == ScreeningEngine.NEGATIVE))
+
+            valid_rows.append(rows[valid])
+            valid_cells.append((gold_idx * shape[1] * shape[2] + stratum_bins[valid]) * shape[3]
+                               + is_positive[valid])
+
+        return keys, np.concatenate(valid_rows), np.concatenate(valid_cells), weights, shape
+
+    def __get_arrays(self, data):
+        scores = data[self.__score_col].to_numpy(dtype=float)
+        weights = data[self.__weight_col].to_numpy(dtype=float)
+
+        return scores, weights
+
+    def __get_strata_codes(self, data, strata):
+        keys = []
+        codes = []
+        for columns, stratum_keys in strata:
+            if isinstance(columns, str):
+                index = pd.Index(stratum_keys)
+                values = data[columns]
+            else:
+                index = pd.MultiIndex.from_tuples(stratum_keys)
+                values = pd.MultiIndex.from_frame(data[columns])
+
+            stratum_codes = index.get_indexer(values)
+            codes.append(np.where(stratum_codes >= 0, stratum_codes + len(keys), -1))
+            keys += list(stratum_keys)
+
+        return keys, codes
+
+    def __get_sens_spec(self, weight_tensor, freq_tensor):
+        # [..., cut-off, gold standard] totals at or above each cut-off
+        weight_above = np.flip(np.cumsum(np.flip(weight_tensor, axis=-2), axis=-2), axis=-2)
+        freq_above = np.flip(np.cumsum(np.flip(freq_tensor, axis=-2), axis=-2), axis=-2)
+
+        positive = self.__split_screens(weight_above[..., ScreeningEngine.POSITIVE],
+                                        freq_above[..., ScreeningEngine.POSITIVE])
+        negative = self.__split_screens(weight_above[..., ScreeningEngine.NEGATIVE],
+                                        freq_above[..., ScreeningEngine.NEGATIVE])
+
+        outcomes = {"True Positive": positive["Screened"],
+                    "False Positive": negative["Screened"],
+                    "True Negative": negative["Not Screened"],
+                    "False Negative": positive["Not Screened"]}
+
+        return self.__get_outcome_ratios(outcomes)
+
+    def __split_screens(self, weight_above, freq_above):
+        screened = {"Weight": weight_above[..., 1:], "Freq": freq_above[..., 1:]}
+        not_screened = {"Weight": weight_above[..., :1] - weight_above[..., 1:],
+                        "Freq": freq_above[..., :1] - freq_above[..., 1:]}
+
+        return {"Screened": screened, "Not Screened": not_screened}
+
+    def __cumulate_screens(self, mask, weights, last, total_weight, total_freq):
+        weight_screened = np.cumsum(np.where(mask, weights, 0))[last][::-1]
+        freq_screened = np.cumsum(mask)[last][::-1]
+
+        screened = {"Weight": weight_screened, "Freq": freq_screened}
+        not_screened = {"Weight": total_weight - weight_screened,
+                        "Freq": total_freq - freq_screened}
+
+        return {"Screened": screened, "Not Screened": not_screened}
+
+    def __get_outcome_ratios(self, outcomes):
+        tp = self.__product(outcomes["True Positive"])
+        fp = self.__product(outcomes["False Positive"])
+        tn = self.__product(outcomes["True Negative"])
+        fn = self.__product(outcomes["False Negative"])
+
+        return self.__ratio(tp, tp + fn), self.__ratio(tn, tn + fp)
+
+    def __to_dict(self, columns, cut_off_scores):
+        sens_spec = {}
+        for idx, score in enumerate(cut_off_scores):
+            sens_spec[score] = {}
+            for name, values in columns.items():
+                sens_spec[score][name] = float(values[idx])
+
+        return sens_spec
+
+    def __product(self, outcome):
+        return outcome["Weight"] * outcome["Freq"]
+
+    def __ratio(self, num, den):
+        return np.divide(num, den, out=np.zeros(np.shape(num)), where=den != 0)
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+
+class StatinsScenarios:
+    COLUMNS = ["Scenario", "Intervention", "Weight"]
+    ALL_INTERVENTIONS = "*"
+    RATIOS = ["TotalStatinsEligiblePre/Pop", "OnStatinsPre/Pop", "NotOnStatinsPre/Pop",
+              "BaselineStatinsUse/Pop", "StatinsUsePost/Pop", "RemainingUsePost/Pop"]
+
+    def __init__(self, definitions=None, ratios=RATIOS):
+        # one row per (scenario, intervention) with the weight its counts enter the scenario with
+        self.__definitions = definitions
+        self.__ratios = list(ratios)
+
+    def read(self, path):
+        definitions = pd.read_csv(path, dtype={"Scenario": str, "Intervention": str})
+        definitions.columns = [col.strip() for col in definitions.columns]
+
+        missing = set(StatinsScenarios.COLUMNS) - set(definitions.columns)
+        if len(missing) > 0:
+            raise ValueError("missing columns " + ", ".join(sorted(missing)))
+
+        ratios = list(self.__ratios)
+        if "Ratios" in definitions.columns:
+            for cell in definitions["Ratios"].dropna():
+                for ratio in str(cell).split(";"):
+                    if ratio.strip() != "" and ratio.strip() not in ratios:
+                        ratios.append(ratio.strip())
+
+        for ratio in ratios:
+            if len(ratio.split("/")) != 2:
+                raise ValueError("ratio " + ratio + " is not of the form A/B")
+
+        self.__definitions = definitions[StatinsScenarios.COLUMNS]
+        self.__ratios = ratios
+
+    def evaluate(self, sums, by="Intervention"):
+        groups = [name for name in sums.index.names if name != by]
+        interventions = list(sums.index.get_level_values(by).unique())
+
+        # counts as an (intervention, group, column) cube, strata absent from a file count as zero
+        cube = sums.unstack(groups, fill_value=0).reindex(interventions)
+        columns = list(sums.columns)
+        group_index = cube.columns.droplevel(0).unique()
+        cube = cube.reindex(columns=pd.MultiIndex.from_product([columns, group_index]), fill_value=0)
+        cube = cube.to_numpy(dtype=float).reshape(len(interventions), len(columns), len(group_index))
+
+        names, weights = self.__get_weights(interventions)
+
+        # every scenario in one pass: filtering and reweighting are a weighted sum over interventions
+        totals = np.einsum("si,icg->sgc", weights, cube)
+        totals = totals.reshape(len(names) * len(group_index), len(columns))
+
+        index = pd.MultiIndex.from_tuples([(name,) + (group if isinstance(group, tuple) else (group,))
+                                           for name in names for group in group_index],
+                                          names=["Scenario"] + groups)
+        table = pd.DataFrame(totals, index=index, columns=columns)
+
+        for ratio in self.__ratios:
+            numerator, denominator = [col.strip() for col in ratio.split("/")]
+            if numerator not in table.columns or denominator not in table.columns:
+                raise ValueError("ratio " + ratio + " uses an unknown column")
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                table[ratio] = table[numerator] / table[denominator]
+
+        return table
+
+    def __get_weights(self, interventions):
+        if self.__definitions is None:
+            # default: all interventions together, then each one on its own
+            names = ["All"] + interventions
+            weights = np.vstack([np.ones(len(interventions)), np.eye(len(interventions))])
+            return names, weights
+
+        names = list(self.__definitions["Scenario"].unique())
+        weights = np.zeros((len(names), len(interventions)))
+        for scenario, intervention, weight in self.__definitions.itertuples(index=False):
+            row = names.index(scenario)
+            if intervention == StatinsScenarios.ALL_INTERVENTIONS:
+                weights[row, :] = weight
+            elif intervention in interventions:
+                weights[row, interventions.index(intervention)] = weight
+
+        return names, weights
@@ -0,0 +1,82 @@
+import pandas as pd
+import os
+
+
+class StratumSums:
+    def __init__(self, strata, weighted_columns, level=None):
+        self.__strata = strata
+        self.__weighted_columns = weighted_columns
+
+        # an index level (e.g. State) kept below the strata, so finer results share the same sums
+        self.__keys = strata if level is None else strata + [level]
+
+        # per stratum: sum of col * Pop for weighted columns, plain sums for everything else
+        self.__sums = None
+        self.__integer_columns = None
+        self.__files = {}
+
+    def add(self, chunk):
+        # parsed compact, but summed in 64 bits so long runs don't lose precision
+        chunk = chunk.astype(self.__widen(chunk.drop(columns=self.__strata).dtypes))
+        for col in self.__weighted_columns:
+            chunk[col] *= chunk.Pop
+
+        self.__fold(chunk.groupby(self.__keys, observed=True).sum(numeric_only=True))
+
+    def add_file(self, path):
+        self.__files[path] = self.__get_signature(path)
+
+    def has_file(self, path):
+        return path in self.__files
+
+    def is_modified(self, path):
+        # a file that changed on disk can't be folded in again, its old rows are already in the sums
+        return path in self.__files and self.__files[path] != self.__get_signature(path)
+
+    def merge(self, other):
+        if other.__sums is not None:
+            self.__fold(other.__sums, other.__integer_columns)
+        self.__files.update(other.__files)
+
+    def get_means(self, by_level=False):
+        if self.__sums is None:
+            return pd.DataFrame()
+
+        data = self.__sums
+        if not by_level and len(self.__keys) > len(self.__strata):
+            data = data.groupby(level=self.__strata).sum()
+
+        data = data.astype({col: "int64" for col in self.__integer_columns})
+        for col in self.__weighted_columns:
+            data[col] /= data.Pop
+
+        return data
+
+    def __fold(self, partial_sums, integer_columns=None):
+        if self.__sums is None:
+            self.__sums = partial_sums
+        else:
+            self.__sums = self.__sums.add(partial_sums, fill_value=0)
+
+        # alignment promotes to float, keep columns that were integral throughout as int
+        if integer_columns is None:
+            integer_columns = set(partial_sums.select_dtypes(include="integer").columns)
+
+        if self.__integer_columns is None:
+            self.__integer_columns = integer_columns
+        else:
+            self.__integer_columns = self.__integer_columns & integer_columns
+
+    def __get_signature(self, path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def __widen(self, dtypes):
+        widened = {}
+        for col, dtype in dtypes.items():
+            if pd.api.types.is_integer_dtype(dtype):
+                widened[col] = "int64"
+            elif pd.api.types.is_float_dtype(dtype):
+                widened[col] = "float64"
+
+        return widened